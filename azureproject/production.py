@@ -38,3 +38,20 @@ DATABASES = {
         'PASSWORD': conn_str_params['password'],
     }
 }
+
+# Share the cache between workers and instances: Azure Cache for Redis when the app is
+# connected to one, otherwise a table of the database (see startup.sh)
+if 'AZURE_REDIS_CONNECTIONSTRING' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['AZURE_REDIS_CONNECTIONSTRING'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'restaurant_review_cache',
+        }
+    }
@@ -35,6 +35,8 @@ if 'CODESPACE_NAME' in os.environ:
 
 INSTALLED_APPS = [
     'restaurant_review.apps.RestaurantReviewConfig',
+    'quicklook.apps.QuicklookConfig',
+    'rest_framework',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -100,6 +102,15 @@ DATABASES = {
     }
 }
 
+# Cache of rendered pages, local to the process during development and tests
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'restaurant-review',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -138,6 +149,20 @@ USE_TZ = True
 STATICFILES_DIRS = (str(BASE_DIR.joinpath('static')),)
 STATIC_URL = 'static/'
 
+# Worker processes for large quicklook batch and simulation jobs
+# 1 evaluates them in the request process
+
+QUICKLOOK_WORKERS = int(os.getenv('QUICKLOOK_WORKERS', 1))
+
+# Seconds a running quicklook job may go without a heartbeat before another worker
+# requeues it, as when its worker died or was redeployed
+
+QUICKLOOK_JOB_TIMEOUT = int(os.getenv('QUICKLOOK_JOB_TIMEOUT', 600))
+
+# Seconds between the heartbeats of a running quicklook job, well below the timeout
+
+QUICKLOOK_JOB_HEARTBEAT = int(os.getenv('QUICKLOOK_JOB_HEARTBEAT', 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
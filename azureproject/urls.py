@@ -18,5 +18,6 @@ from django.urls import include, path
 
 urlpatterns = [
     path('', include('restaurant_review.urls')),
+    path('quicklook/', include('quicklook.urls')),
     path('admin/', admin.site.urls),
 ]
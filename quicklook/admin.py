@@ -1,3 +1,39 @@
 from django.contrib import admin
 
+from .models import AssumptionSet, RegionAssumption
+
 # Register your models here.
+
+
+class RegionAssumptionInline(admin.TabularInline):
+    """
+    The regions of a set can only be edited until it is first activated:
+    load_assumptions caches tables, and results are stored, by set
+    """
+    model = RegionAssumption
+    extra = 1
+
+    def has_add_permission(self, request, obj=None):
+        return not (obj and obj.activated) and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return not (obj and obj.activated) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not (obj and obj.activated) and super().has_delete_permission(request, obj)
+
+
+@admin.register(AssumptionSet)
+class AssumptionSetAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "created", "note", "active", "activated")
+    readonly_fields = ("activated",)
+    inlines = [RegionAssumptionInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        """
+        A set stays active once activated, so that its regions cannot be edited while
+        it is briefly inactive
+        """
+        if obj and obj.activated:
+            return (*self.readonly_fields, "active")
+        return self.readonly_fields
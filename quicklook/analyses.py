@@ -0,0 +1,220 @@
+"""
+The analyses behind the quicklook endpoints, shared by the views that answer them
+directly and by the worker that runs them as jobs
+
+Each analysis takes the validated data of its serializer and returns the JSON-ready
+response body.
+"""
+import numpy as np
+from django.db import IntegrityError, transaction
+
+from .models import QuickLookQuery, QuickLookResults
+from .ro_utils import (
+    DEAL_DATE_COLUMNS,
+    DEFAULT_ASSUMPTIONS,
+    DealBatch,
+    input_hash,
+    sensitivity_grid,
+)
+from .runner import run_batch, run_simulation
+
+"""
+Rows per INSERT when saving the queries of a bulk submission
+"""
+BULK_BATCH_SIZE = 1000
+
+
+def query_record(query):
+    """
+    A validated QuickLookQuery as a DealBatch record, with dates moved to the first of
+    their month as in quick_look_analysis
+    """
+    record = dict(query)
+    for name in DEAL_DATE_COLUMNS:
+        record[name] = record[name].replace(day=1)
+    return record
+
+
+def grid_to_list(values, shape):
+    """
+    Nested lists of a metric over the grid, with None where it is undefined
+    """
+    values = values.astype(object)
+    values[~np.isfinite(values.astype(float))] = None
+    return values.reshape(shape).tolist()
+
+
+def sensitivity(data, workers=None, progress=None, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Evaluate one deal over a grid of exit cap, rent and hard cost values
+
+    Parameters
+    ----------
+    data : mapping
+        SensitivitySerializer data
+    workers: int
+        Unused, the grid is evaluated in process
+    progress: callable
+        Called with 1.0 once the grid is evaluated
+    assumptions: AssumptionTable
+        The region assumptions to evaluate the deal with
+    """
+    axes = {
+        name: np.linspace(axis["start"], axis["stop"], axis["num"])
+        for name, axis in data["ranges"].items()
+    }
+    shape, results = sensitivity_grid(query_record(data["query"]), axes, assumptions)
+    if progress is not None:
+        progress(1.0)
+
+    return {
+        "axes": {name: values.tolist() for name, values in axes.items()},
+        "unlevered_irr": grid_to_list(results.unlevered_irr, shape),
+        "unlevered_mult": grid_to_list(results.unlevered_mult, shape),
+        "yoc": grid_to_list(results.yoc, shape),
+    }
+
+
+def simulation(data, workers=None, progress=None, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Monte Carlo simulation of one deal
+
+    Parameters
+    ----------
+    data : mapping
+        SimulationSerializer data
+    workers: int
+        The number of processes to evaluate the paths in
+    progress: callable
+        Called with the fraction of paths evaluated after each chunk
+    assumptions: AssumptionTable
+        The region assumptions to evaluate the deal with
+    """
+    results, stats = run_simulation(
+        query_record(data["query"]),
+        data["distributions"],
+        paths=data["paths"],
+        seed=data.get("seed"),
+        workers=workers,
+        progress=progress,
+        assumptions=assumptions,
+    )
+    return {
+        **results.summary(),
+        "workers": [
+            {
+                "pid": worker.pid,
+                "paths": worker.items,
+                "seconds": worker.seconds,
+                "paths_per_second": worker.throughput,
+            }
+            for worker in stats
+        ],
+    }
+
+
+def evaluate_queries(queries, workers=None, progress=None, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Save and evaluate validated queries, each distinct set of inputs once
+
+    Queries whose inputs were evaluated before get their stored results back, as do
+    those whose inputs a concurrent request saved first. Any other IntegrityError is
+    raised.
+
+    Parameters
+    ----------
+    queries : list
+        QuickLookQuerySerializer data
+    workers: int
+        The number of processes to evaluate the new queries in
+    progress: callable
+        Called with the fraction of new queries evaluated after each chunk
+    assumptions: AssumptionTable
+        The region assumptions to evaluate the queries with
+
+    Output
+    ------
+    The QuickLookResults of every query, in order, and whether any were created
+    """
+    keys = [input_hash(data, assumptions.version) for data in queries]
+    results = QuickLookResults.objects.in_bulk(set(keys), field_name="input_hash")
+
+    """
+    Evaluate each new set of inputs once, however many queries hold it
+    """
+    new = {}
+    for key, data in zip(keys, queries):
+        if key not in results:
+            new.setdefault(key, data)
+
+    created = False
+    if new:
+        evaluated, _ = run_batch(
+            DealBatch.from_records(query_record(data) for data in new.values()),
+            workers=workers,
+            progress=progress,
+            assumptions=assumptions,
+        )
+        values = dict(zip(new, evaluated.records()))
+    elif progress is not None:
+        progress(1.0)
+
+    while new:
+        try:
+            with transaction.atomic():
+                saved = QuickLookQuery.objects.bulk_create(
+                    [QuickLookQuery(**data) for data in new.values()],
+                    batch_size=BULK_BATCH_SIZE,
+                )
+                stored = QuickLookResults.objects.bulk_create(
+                    [
+                        QuickLookResults(query=query, input_hash=key, **values[key])
+                        for query, key in zip(saved, new)
+                    ],
+                    batch_size=BULK_BATCH_SIZE,
+                )
+        except IntegrityError:
+            """
+            Take the results a concurrent request stored for some of the inputs, and
+            save the others again
+            """
+            stored_meanwhile = QuickLookResults.objects.in_bulk(
+                list(new), field_name="input_hash"
+            )
+            if not stored_meanwhile:
+                raise
+            results.update(stored_meanwhile)
+            new = {key: data for key, data in new.items() if key not in stored_meanwhile}
+            continue
+        results.update(zip(new, stored))
+        created = True
+        break
+
+    return [results[key] for key in keys], created
+
+
+def bulk(data, workers=None, progress=None, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Save and evaluate the queries of a bulk submission
+
+    Parameters
+    ----------
+    data : list
+        BulkSerializer data
+    workers: int
+        The number of processes to evaluate the new queries in
+    progress: callable
+        Called with the fraction of new queries evaluated after each chunk
+    assumptions: AssumptionTable
+        The region assumptions to evaluate the queries with
+    """
+    """
+    serializers imports portfolios, which imports this module
+    """
+    from .serializers import QuickLookResultsSerializer
+
+    results, _ = evaluate_queries(data, workers, progress, assumptions)
+    return [
+        {"row": row, "results": QuickLookResultsSerializer(result).data}
+        for row, result in enumerate(results)
+    ]
@@ -0,0 +1,36 @@
+"""
+Region assumptions stored in the database
+
+Each AssumptionSet is read once per process and kept as an immutable AssumptionTable,
+so a request only costs one indexed query to find the active version.
+"""
+from .models import AssumptionSet, RegionAssumption
+from .ro_utils import ASSUMPTION_FIELDS, DEFAULT_ASSUMPTIONS, AssumptionTable, RegionAssumptions
+
+_tables = {}
+
+
+def load_assumptions():
+    """
+    Output
+    ------
+    The AssumptionTable of the latest active AssumptionSet, or DEFAULT_ASSUMPTIONS when
+    no set is active
+    """
+    version = (
+        AssumptionSet.objects.filter(active=True)
+        .order_by("-pk")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if version is None:
+        return DEFAULT_ASSUMPTIONS
+    if version not in _tables:
+        rows = RegionAssumption.objects.filter(assumption_set=version).values(
+            "region", *ASSUMPTION_FIELDS
+        )
+        _tables[version] = AssumptionTable(
+            version=version,
+            assumptions={row.pop("region"): RegionAssumptions(**row) for row in rows},
+        )
+    return _tables[version]
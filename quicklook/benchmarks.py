@@ -0,0 +1,302 @@
+"""
+Benchmarks for the quicklook cash flow engine
+
+Every benchmark calls its function repeatedly and reports the latency percentiles of a
+call, the throughput in deals (or cash flows) per second and the peak memory allocated
+by one call, as traced by tracemalloc. Inputs are drawn from a fixed seed so that runs
+are comparable; save a run with --json and compare it with a later one to spot
+regressions.
+
+The engine, batch and IRR suites run from the project root with:
+
+    python -m quicklook.benchmarks
+
+The quicklook_benchmark management command runs them too, along with the
+quick_look_analysis POST through the Django test client against a test database.
+"""
+import argparse
+import datetime
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import numpy as np
+
+from .ro_utils import (
+    DealBatch,
+    DealValues,
+    KeyDates,
+    QuicklookInputs,
+    evaluate_batch,
+    irr_batch,
+    xirr_batch,
+    year_fractions,
+)
+
+BENCHMARK_SEED = 20240101
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+PERCENTILES = (50, 95, 99)
+
+"""
+Every benchmark makes at least MIN_CALLS calls, and more until it has run for
+MIN_SECONDS or made MAX_CALLS calls
+"""
+MIN_CALLS = 5
+MAX_CALLS = 1000
+MIN_SECONDS = 0.5
+
+"""
+The metric methods of QuicklookInputs, timed on an already built cash flow
+"""
+METRICS = (
+    "unlevered_irr",
+    "unlevered_em",
+    "yoc",
+    "unlevered_ncf",
+    "total_unlevered_cost",
+    "total_levered_cost",
+    "unlevered_peak_equity",
+    "net_sale_price",
+)
+
+
+def sample_inputs():
+    """
+    A representative UK deal, roughly four years from land purchase to sale
+    """
+    return QuicklookInputs(
+        name="Benchmark Deal",
+        key_dates=KeyDates(
+            land_purchase_date=datetime.datetime(2024, 1, 1),
+            mass_grading_start=datetime.datetime(2024, 6, 1),
+            building_sale=datetime.datetime(2027, 6, 1),
+            rent_free_period=3,
+            lease_up_period=6,
+        ),
+        values=DealValues(
+            exit_cap=5.5,
+            building_hard_cost=80,
+            building_soft_cost=15,
+            tenant_improvements=10,
+            cash_contributions=50000,
+            land_cost=2000000,
+            total_area=100000,
+            rent_per_unit_area=8,
+            region="UK",
+        ),
+    )
+
+
+def sample_record():
+    inputs = sample_inputs()
+    return {"name": inputs.name, **inputs.key_dates.record(), **inputs.values.record()}
+
+
+def sample_batch(size, seed=BENCHMARK_SEED):
+    """
+    size variations of the sample deal, spread over the inputs a user would vary
+    """
+    generator = np.random.default_rng(seed)
+    return DealBatch.repeat(
+        sample_record(),
+        size,
+        exit_cap=generator.uniform(4, 8, size),
+        rent_per_unit_area=generator.uniform(6, 10, size),
+        building_hard_cost=generator.uniform(60, 100, size),
+        lease_up_period=generator.integers(0, 12, size),
+    )
+
+
+@dataclass
+class Benchmark:
+    """
+    The measurements of one benchmark
+
+    Parameters
+    ----------
+    name : string
+        What was timed
+    size: int
+        The number of deals (or cash flows) handled by one call
+    seconds: list
+        The duration of every call
+    peak_memory: int
+        The peak bytes allocated during one call
+    """
+
+    name: str
+    size: int
+    seconds: list
+    peak_memory: int
+
+    def percentiles(self, percentiles=PERCENTILES):
+        return dict(zip(percentiles, np.percentile(self.seconds, percentiles).tolist()))
+
+    @property
+    def throughput(self):
+        """
+        Deals per second, over the median call
+        """
+        return self.size / float(np.median(self.seconds))
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "size": self.size,
+            "calls": len(self.seconds),
+            "percentiles": self.percentiles(),
+            "throughput": self.throughput,
+            "peak_memory": self.peak_memory,
+        }
+
+
+def measure(name, function, size=1, setup=None):
+    """
+    Time calls of function, after setup when given, then trace the memory of one call
+
+    Output
+    ------
+    Benchmark
+    """
+    seconds = []
+    began = time.perf_counter()
+    while len(seconds) < MAX_CALLS and (
+        len(seconds) < MIN_CALLS or time.perf_counter() - began < MIN_SECONDS
+    ):
+        if setup is not None:
+            setup()
+        call = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - call)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Benchmark(name=name, size=size, seconds=seconds, peak_memory=peak_memory)
+
+
+def engine_benchmarks():
+    """
+    One deal: the cash flow with the pandas reference and the CashFlow engine, every
+    metric on a built cash flow, and the full set of results from the inputs
+    """
+    inputs = sample_inputs()
+    benchmarks = [
+        measure("uses_cash_flow_pandas", inputs.uses_cash_flow_pandas),
+        measure("cash_flow", inputs.cash_flow, setup=inputs.invalidate_cash_flow),
+        measure("uses_cash_flow", inputs.uses_cash_flow, setup=inputs.invalidate_cash_flow),
+    ]
+    inputs.cash_flow()
+    benchmarks += [measure(metric, getattr(inputs, metric)) for metric in METRICS]
+    benchmarks.append(measure("results", inputs.results, setup=inputs.invalidate_cash_flow))
+    benchmarks.append(
+        measure(
+            "update exit_cap",
+            lambda: inputs.update(exit_cap=6.0),
+            setup=lambda: inputs.update(exit_cap=5.5),
+        )
+    )
+    return benchmarks
+
+
+def batch_benchmarks(sizes=BATCH_SIZES):
+    """
+    evaluate_batch over batches of every size
+    """
+    benchmarks = []
+    for size in sizes:
+        deals = sample_batch(size)
+        benchmarks.append(
+            measure(f"evaluate_batch[{size}]", lambda: evaluate_batch(deals), size=size)
+        )
+    return benchmarks
+
+
+def irr_benchmarks(sizes=BATCH_SIZES):
+    """
+    xirr_batch and irr_batch over the cash flows of batches of every size
+    """
+    benchmarks = []
+    for size in sizes:
+        results = evaluate_batch(sample_batch(size))
+        times = year_fractions(results.dates)
+        cash_flows = results.cash_flows
+        benchmarks += [
+            measure(f"xirr_batch[{size}]", lambda: xirr_batch(cash_flows, times), size=size),
+            measure(f"irr_batch[{size}]", lambda: irr_batch(cash_flows), size=size),
+        ]
+    return benchmarks
+
+
+SUITES = {
+    "engine": engine_benchmarks,
+    "batch": batch_benchmarks,
+    "irr": irr_benchmarks,
+}
+
+
+def format_report(benchmarks):
+    """
+    The benchmarks as a table, with times in microseconds
+    """
+    header = (
+        f"{'benchmark':<34}{'p50 us':>12}{'p95 us':>12}{'p99 us':>12}"
+        f"{'deals/s':>14}{'peak KiB':>12}"
+    )
+    lines = [header, "-" * len(header)]
+    for benchmark in benchmarks:
+        p50, p95, p99 = (value * 1e6 for value in benchmark.percentiles().values())
+        lines.append(
+            f"{benchmark.name:<34}{p50:>12.1f}{p95:>12.1f}{p99:>12.1f}"
+            f"{benchmark.throughput:>14.0f}{benchmark.peak_memory / 1024:>12.1f}"
+        )
+    return "\n".join(lines)
+
+
+def write_json(benchmarks, path):
+    with open(path, "w") as output:
+        json.dump([benchmark.summary() for benchmark in benchmarks], output, indent=2)
+
+
+def add_arguments(parser, suites=tuple(SUITES)):
+    parser.add_argument(
+        "--suite",
+        action="append",
+        choices=suites,
+        help="A suite to run, may be repeated; all of them by default",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=max(BATCH_SIZES),
+        help="Leave out batch sizes above this",
+    )
+    parser.add_argument("--json", help="Also write the measurements to this file")
+
+
+def run_suites(suites, max_batch):
+    sizes = tuple(size for size in BATCH_SIZES if size <= max_batch)
+    benchmarks = []
+    for suite in suites:
+        benchmarks += SUITES[suite]() if suite == "engine" else SUITES[suite](sizes)
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    options = parser.parse_args()
+    benchmarks = run_suites(options.suite or list(SUITES), options.max_batch)
+    print(format_report(benchmarks))
+    if options.json:
+        write_json(benchmarks, options.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Streaming export of the monthly cash flow line items of many deals
+
+Deals are evaluated a chunk at a time and each chunk is encoded and handed over as
+soon as it is ready, so an export only ever holds one chunk of cash flows however
+many deals it covers. Rows are one month of one deal: its key, its name, the date and
+every line item of QuicklookInputs.uses_cash_flow.
+
+CSV needs nothing beyond pandas; the Arrow IPC stream and Parquet formats need the
+optional pyarrow package.
+"""
+import functools
+from itertools import islice
+
+import numpy as np
+
+from .ro_utils import LINE_ITEMS, month_start_array
+
+"""
+Export formats and their media types
+"""
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+"""
+Deals evaluated and encoded together, 121 rows each over the default horizon
+"""
+EXPORT_CHUNK_SIZE = 500
+
+
+@functools.lru_cache(maxsize=None)
+def pyarrow_importable():
+    """
+    Whether pyarrow imports, which an installed build made for another NumPy does not
+    """
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_available(output):
+    """
+    Whether the packages needed to export to output are installed and import
+    """
+    return output == "csv" or pyarrow_importable()
+
+
+def cash_flow_frames(deals, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the cash flows of the deals as one dataframe per chunk of deals
+
+    Parameters
+    ----------
+    deals : iterable
+        (key, QuicklookInputs) pairs, where key is an integer identifying the deal
+    chunk_size: int
+        The number of deals in each dataframe
+    """
+    import pandas as pd
+
+    deals = iter(deals)
+    while chunk := list(islice(deals, chunk_size)):
+        cash_flows = [(key, inputs.name, inputs.cash_flow()) for key, inputs in chunk]
+        frame = pd.DataFrame(
+            np.concatenate([cash_flow.data for _, _, cash_flow in cash_flows], axis=1).T,
+            columns=list(LINE_ITEMS),
+        )
+        frame.insert(
+            0,
+            "Date",
+            np.concatenate(
+                [
+                    month_start_array(cash_flow.start, len(cash_flow)).astype("datetime64[ns]")
+                    for _, _, cash_flow in cash_flows
+                ]
+            ),
+        )
+        frame.insert(
+            0,
+            "name",
+            np.repeat([name for _, name, _ in cash_flows], [len(c) for _, _, c in cash_flows]),
+        )
+        frame.insert(
+            0,
+            "deal",
+            np.repeat(
+                np.array([key for key, _, _ in cash_flows], dtype=np.int64),
+                [len(cash_flow) for _, _, cash_flow in cash_flows],
+            ),
+        )
+        yield frame
+
+
+def export_cash_flows(deals, output, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the encoded cash flows of the deals, one piece per chunk of deals
+
+    Parameters
+    ----------
+    deals : iterable
+        (key, QuicklookInputs) pairs, see cash_flow_frames
+    output: string
+        One of the EXPORT_FORMATS
+    """
+    frames = cash_flow_frames(deals, chunk_size)
+    if output == "csv":
+        return _export_csv(frames)
+    return _export_arrow(frames, output)
+
+
+def _export_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, date_format="%Y-%m-%d")
+        header = False
+    if header:
+        yield ",".join(["deal", "name", "Date", *LINE_ITEMS]) + "\n"
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [("deal", pa.int64()), ("name", pa.string()), ("Date", pa.timestamp("ns"))]
+        + [(name, pa.float64()) for name in LINE_ITEMS]
+    )
+
+
+class _Buffer:
+    """
+    A write-only file for the pyarrow writers that hands over what was written to it
+    since it was last drained
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _export_arrow(frames, output):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    buffer = _Buffer()
+    sink = pa.PythonFile(buffer, mode="w")
+    if output == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+        convert = pa.Table.from_pandas
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        convert = pa.RecordBatch.from_pandas
+
+    for frame in frames:
+        write(convert(frame, schema=schema, preserve_index=False))
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
@@ -0,0 +1,129 @@
+"""
+A job queue for quicklook analyses that outlast a web request, kept in Postgres
+
+Jobs are QuickLookJob rows. Workers (manage.py quicklook_worker) claim the oldest
+queued job with SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can poll the
+table without a broker and without two of them claiming the same job.
+
+A running job records a heartbeat every QUICKLOOK_JOB_HEARTBEAT seconds from a
+thread of its worker, however long the analysis goes without reporting progress. One
+whose heartbeat is older than QUICKLOOK_JOB_TIMEOUT lost its worker and is queued
+again.
+"""
+import contextlib
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .analyses import bulk, sensitivity, simulation
+from .assumptions import load_assumptions
+from .models import QuickLookJob
+from .serializers import QuickLookJobSerializer
+
+logger = logging.getLogger(__name__)
+
+ANALYSES = {
+    QuickLookJob.SENSITIVITY: sensitivity,
+    QuickLookJob.SIMULATION: simulation,
+    QuickLookJob.BULK: bulk,
+}
+
+
+def requeue_stale_jobs():
+    """
+    Queue again the running jobs without a heartbeat for QUICKLOOK_JOB_TIMEOUT seconds
+
+    Output
+    ------
+    The number of jobs queued again
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.QUICKLOOK_JOB_TIMEOUT)
+    return QuickLookJob.objects.filter(
+        status=QuickLookJob.RUNNING, heartbeat__lt=cutoff
+    ).update(status=QuickLookJob.QUEUED, progress=0, heartbeat=None)
+
+
+def claim_job():
+    """
+    Mark the oldest queued job as running and return it, or None when none is queued
+
+    Stale running jobs are queued again first.
+    """
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = (
+            QuickLookJob.objects.select_for_update(skip_locked=True)
+            .filter(status=QuickLookJob.QUEUED)
+            .order_by("created", "pk")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = QuickLookJob.RUNNING
+        job.started = job.heartbeat = timezone.now()
+        job.save(update_fields=["status", "started", "heartbeat"])
+    return job
+
+
+@contextlib.contextmanager
+def heartbeat(job, interval):
+    """
+    Record the heartbeat of job every interval seconds until the block exits
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                QuickLookJob.objects.filter(pk=job.pk).update(heartbeat=timezone.now())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"quicklook-job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """
+    Run a claimed job and store its result, or a short error when it fails, whose
+    traceback goes to the log
+    """
+
+    def progress(fraction):
+        QuickLookJob.objects.filter(pk=job.pk).update(progress=fraction)
+
+    try:
+        assumptions = load_assumptions()
+        serializer = QuickLookJobSerializer.ANALYSES[job.kind](
+            data=job.payload, context={"assumptions": assumptions}
+        )
+        serializer.is_valid(raise_exception=True)
+        with heartbeat(job, settings.QUICKLOOK_JOB_HEARTBEAT):
+            job.result = ANALYSES[job.kind](
+                serializer.validated_data,
+                workers=settings.QUICKLOOK_WORKERS,
+                progress=progress,
+                assumptions=assumptions,
+            )
+        job.status = QuickLookJob.DONE
+        job.progress = 1.0
+    except ValidationError as error:
+        job.status = QuickLookJob.FAILED
+        job.error = f"The payload is no longer valid: {error.detail}"
+    except Exception:
+        logger.exception("Quicklook job %s failed", job.pk)
+        job.status = QuickLookJob.FAILED
+        job.error = f"The {job.kind} analysis failed, see the worker log for job {job.pk}."
+    job.finished = timezone.now()
+    job.save(update_fields=["result", "status", "progress", "error", "finished"])
+    return job
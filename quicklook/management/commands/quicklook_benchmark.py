@@ -0,0 +1,80 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from quicklook.benchmarks import (
+    SUITES,
+    add_arguments,
+    format_report,
+    measure,
+    run_suites,
+    sample_record,
+    write_json,
+)
+from quicklook.ro_utils import DEAL_DATE_COLUMNS
+
+
+def http_benchmarks():
+    """
+    The quick_look_analysis POST through the test client, with inputs never seen
+    before (evaluated and saved) and with inputs answered from the stored results
+    """
+    client = Client()
+    url = reverse("quick_look_analysis")
+    data = sample_record()
+    for name in DEAL_DATE_COLUMNS:
+        data[name] = f"{data[name]:%Y-%m-%d}"
+    land_costs = itertools.count(int(data["land_cost"]) + 1)
+
+    def post(body, expected):
+        response = client.post(url, body, content_type="application/json")
+        if response.status_code != expected:
+            raise RuntimeError(f"quick_look_analysis answered {response.status_code}")
+
+    def post_new():
+        post({**data, "land_cost": next(land_costs)}, 201)
+
+    def post_stored():
+        post(data, 200)
+
+    post(data, 201)
+    return [
+        measure("POST quick_look_analysis", post_new),
+        measure("POST quick_look_analysis stored", post_stored),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the quicklook engine, batch evaluation, IRR solvers and the "
+        "quick_look_analysis endpoint, which runs against a throwaway test database"
+    )
+
+    def add_arguments(self, parser):
+        add_arguments(parser, suites=tuple(SUITES) + ("http",))
+
+    def handle(self, *args, **options):
+        suites = options["suite"] or list(SUITES) + ["http"]
+        benchmarks = run_suites(
+            [suite for suite in suites if suite in SUITES], options["max_batch"]
+        )
+        if "http" in suites:
+            setup_test_environment()
+            databases = setup_databases(verbosity=0, interactive=False)
+            try:
+                benchmarks += http_benchmarks()
+            finally:
+                teardown_databases(databases, verbosity=0)
+                teardown_test_environment()
+
+        self.stdout.write(format_report(benchmarks))
+        if options["json"]:
+            write_json(benchmarks, options["json"])
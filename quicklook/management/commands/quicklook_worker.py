@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quicklook.jobs import claim_job, run_job
+from quicklook.models import QuickLookJob
+
+
+class Command(BaseCommand):
+    help = "Run queued quicklook jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running {job.kind} job {job.pk}")
+            job = run_job(job)
+            if job.status == QuickLookJob.FAILED:
+                self.stderr.write(f"Job {job.pk} failed\n{job.error}")
+            else:
+                self.stdout.write(f"Job {job.pk} done")
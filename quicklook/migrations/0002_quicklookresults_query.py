@@ -0,0 +1,29 @@
+# Generated by Django 4.2.4 on 2026-10-16 20:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quicklookresults',
+            name='input_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='quicklookresults',
+            name='query',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='results', to='quicklook.quicklookquery'),
+        ),
+        migrations.AlterField(
+            model_name='quicklookresults',
+            name='unlevered_irr',
+            field=models.FloatField(null=True, verbose_name='Unlevered IRR'),
+        ),
+    ]
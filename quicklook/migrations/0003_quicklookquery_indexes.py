@@ -0,0 +1,21 @@
+# Generated by Django 4.2.4 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0002_quicklookresults_query'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quicklookquery',
+            index=models.Index(fields=['-date', '-id'], name='quicklook_query_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quicklookquery',
+            index=models.Index(fields=['region', '-date', '-id'], name='quicklook_query_region_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.4 on 2026-10-16 20:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+"""
+The assumptions the engine used before they were stored, as the first active set.
+Rent is quoted per year in the UK and US and per month in Poland and Germany.
+"""
+INITIAL_ASSUMPTIONS = {
+    "UK": (1, 0.11, 0.0935),
+    "US": (1, 0.038, 0.05),
+    "Poland": (12, 0.038, 0.05),
+    "Germany": (12, 0.038, 0.05),
+}
+
+
+def create_initial_assumptions(apps, schema_editor):
+    AssumptionSet = apps.get_model("quicklook", "AssumptionSet")
+    RegionAssumption = apps.get_model("quicklook", "RegionAssumption")
+    assumption_set = AssumptionSet.objects.create(note="Initial assumptions", active=True)
+    RegionAssumption.objects.bulk_create(
+        RegionAssumption(
+            assumption_set=assumption_set,
+            region=region,
+            rent_periods_per_year=rent_periods_per_year,
+            debt_fees_pc=debt_fees_pc,
+            disposition_pc=disposition_pc,
+            tenant_rep_commission_pc=0.265,
+            landlord_rep_commission_pc=0.017,
+            rental_costs=0.25,
+            mass_grading_proportion=0.25,
+        )
+        for region, (
+            rent_periods_per_year,
+            debt_fees_pc,
+            disposition_pc,
+        ) in INITIAL_ASSUMPTIONS.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0004_quicklookjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssumptionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('note', models.CharField(blank=True, max_length=240)),
+                ('active', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='quicklookquery',
+            name='region',
+            field=models.CharField(max_length=240),
+        ),
+        migrations.CreateModel(
+            name='RegionAssumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(max_length=240)),
+                ('rent_periods_per_year', models.IntegerField()),
+                ('debt_fees_pc', models.FloatField()),
+                ('disposition_pc', models.FloatField()),
+                ('tenant_rep_commission_pc', models.FloatField()),
+                ('landlord_rep_commission_pc', models.FloatField()),
+                ('rental_costs', models.FloatField()),
+                ('mass_grading_proportion', models.FloatField()),
+                ('assumption_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regions', to='quicklook.assumptionset')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='regionassumption',
+            constraint=models.UniqueConstraint(fields=('assumption_set', 'region'), name='quicklook_region_assumption_unique'),
+        ),
+        migrations.RunPython(create_initial_assumptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.4 on 2026-10-16 21:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0005_region_assumptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Portfolio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=240)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('input_hash', models.CharField(blank=True, editable=False, max_length=64)),
+                ('cash_flow_start', models.DateField(editable=False, null=True)),
+                ('cash_flow', models.BinaryField(null=True)),
+                ('unlevered_irr', models.FloatField(null=True, verbose_name='Unlevered IRR')),
+                ('unlevered_mult', models.FloatField(null=True, verbose_name='Unlevered EM')),
+                ('ncf', models.FloatField(null=True, verbose_name='Net Cash Flow')),
+                ('unl_peak_equity', models.FloatField(null=True, verbose_name='Unlevered Peak Equity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PortfolioDeal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_hash', models.CharField(blank=True, editable=False, max_length=64)),
+                ('cash_flow_start', models.DateField(editable=False, null=True)),
+                ('cash_flow', models.BinaryField(null=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deals', to='quicklook.portfolio')),
+                ('query', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quicklook.quicklookquery')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='queries',
+            field=models.ManyToManyField(related_name='portfolios', through='quicklook.PortfolioDeal', to='quicklook.quicklookquery'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliodeal',
+            constraint=models.UniqueConstraint(fields=('portfolio', 'query'), name='quicklook_portfolio_deal_unique'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0006_portfolio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quicklookjob',
+            name='heartbeat',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='quicklookjob',
+            name='kind',
+            field=models.CharField(choices=[('sensitivity', 'Sensitivity'), ('simulation', 'Simulation'), ('bulk', 'Bulk')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='quicklookjob',
+            index=models.Index(condition=models.Q(('status', 'running')), fields=['heartbeat'], name='quicklook_job_running_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.4 on 2026-10-16 22:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_activated(apps, schema_editor):
+    """
+    Sets already active were activated no later than they were created
+    """
+    AssumptionSet = apps.get_model('quicklook', 'AssumptionSet')
+    AssumptionSet.objects.filter(active=True).update(activated=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quicklook', '0007_quicklookjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assumptionset',
+            name='activated',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(set_activated, migrations.RunPython.noop),
+    ]
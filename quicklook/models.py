@@ -1,20 +1,56 @@
 from django.db import models
+from django.utils import timezone
+
+
+class AssumptionSet(models.Model):
+    """
+    A version of the region assumptions
+
+    The latest active set is the one deals are evaluated with. Sets are not edited
+    once they have been active, which activated records: changes, new markets
+    included, go into a new set.
+    """
+    created = models.DateTimeField(auto_now_add=True)
+    note = models.CharField(max_length=240, blank=True)
+    active = models.BooleanField(default=False)
+    activated = models.DateTimeField(null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.active and self.activated is None:
+            self.activated = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "activated"}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Assumptions v{self.pk}"
+
+
+class RegionAssumption(models.Model):
+    assumption_set = models.ForeignKey(
+        AssumptionSet, on_delete=models.CASCADE, related_name="regions"
+    )
+    region = models.CharField(max_length=240)
+    rent_periods_per_year = models.IntegerField()
+    debt_fees_pc = models.FloatField()
+    disposition_pc = models.FloatField()
+    tenant_rep_commission_pc = models.FloatField()
+    landlord_rep_commission_pc = models.FloatField()
+    rental_costs = models.FloatField()
+    mass_grading_proportion = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["assumption_set", "region"], name="quicklook_region_assumption_unique"
+            ),
+        ]
+
 
 class QuickLookQuery(models.Model):
-    UK = "UK"
-    POLAND = "Poland"
-    GERMANY = "Germany"
-    US = "US"
-    REGIONS = [
-        (UK, "UK"),
-        (POLAND, "Poland"),
-        (GERMANY, "Germany"),
-        (US, "US"),
-    ]
     name = models.CharField(max_length=240)
     land_purchase_date = models.DateField()
-    region = models.CharField(max_length=240,
-                              choices=REGIONS)
+    region = models.CharField(max_length=240)
     date = models.DateTimeField(auto_now_add=True)
     building_sale = models.DateField()
     mass_grading_start = models.DateField()
@@ -29,8 +65,23 @@ class QuickLookQuery(models.Model):
     rent_free_period = models.IntegerField()
     lease_up_period = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="quicklook_query_date_idx"),
+            models.Index(
+                fields=["region", "-date", "-id"], name="quicklook_query_region_idx"
+            ),
+        ]
+
 class QuickLookResults(models.Model):
-    unlevered_irr = models.FloatField("Unlevered IRR")
+    query = models.OneToOneField(
+        QuickLookQuery,
+        on_delete=models.CASCADE,
+        related_name="results",
+        null=True,
+    )
+    input_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    unlevered_irr = models.FloatField("Unlevered IRR", null=True)
     unlevered_mult = models.FloatField("Unlevered EM")
     yoc = models.FloatField("Yield on Cost")
     ncf = models.FloatField("Net Cash Flow")
@@ -38,4 +89,93 @@ class QuickLookResults(models.Model):
     lev_costs = models.FloatField("Total Levered Costs")
     unl_peak_equity = models.FloatField("Unlevered Peak Equity")
     net_sale_price = models.FloatField("Net Sale Price")
-    gross_sale_price = models.FloatField("Gross Sale Price")
\ No newline at end of file
+    gross_sale_price = models.FloatField("Gross Sale Price")
+
+class QuickLookJob(models.Model):
+    SENSITIVITY = "sensitivity"
+    SIMULATION = "simulation"
+    BULK = "bulk"
+    KINDS = [
+        (SENSITIVITY, "Sensitivity"),
+        (SIMULATION, "Simulation"),
+        (BULK, "Bulk"),
+    ]
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    kind = models.CharField(max_length=20, choices=KINDS)
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
+    progress = models.FloatField(default=0)
+    payload = models.JSONField()
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    heartbeat = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created", "id"],
+                condition=models.Q(status="queued"),
+                name="quicklook_job_queued_idx",
+            ),
+            models.Index(
+                fields=["heartbeat"],
+                condition=models.Q(status="running"),
+                name="quicklook_job_running_idx",
+            ),
+        ]
+
+
+class Portfolio(models.Model):
+    """
+    A group of saved deals evaluated as one fund
+
+    The summed unlevered cash flow (float64 bytes, one value per month from
+    cash_flow_start) and its metrics are kept as last refreshed by
+    quicklook.portfolios; input_hash identifies the member cash flows they were
+    summed from.
+    """
+    name = models.CharField(max_length=240)
+    created = models.DateTimeField(auto_now_add=True)
+    queries = models.ManyToManyField(
+        QuickLookQuery, through="PortfolioDeal", related_name="portfolios"
+    )
+    input_hash = models.CharField(max_length=64, blank=True, editable=False)
+    cash_flow_start = models.DateField(null=True, editable=False)
+    cash_flow = models.BinaryField(null=True)
+    unlevered_irr = models.FloatField("Unlevered IRR", null=True)
+    unlevered_mult = models.FloatField("Unlevered EM", null=True)
+    ncf = models.FloatField("Net Cash Flow", null=True)
+    unl_peak_equity = models.FloatField("Unlevered Peak Equity", null=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PortfolioDeal(models.Model):
+    """
+    A deal of a portfolio, with its unlevered cash flow as of the inputs and
+    assumptions hashed in input_hash
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name="deals")
+    query = models.ForeignKey(QuickLookQuery, on_delete=models.CASCADE)
+    input_hash = models.CharField(max_length=64, blank=True, editable=False)
+    cash_flow_start = models.DateField(null=True, editable=False)
+    cash_flow = models.BinaryField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["portfolio", "query"], name="quicklook_portfolio_deal_unique"
+            ),
+        ]
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class QuickLookQueryPagination(CursorPagination):
+    """
+    Cursor pagination of saved queries, newest first
+
+    The cursor holds the date of the last row of the page and how many rows with that
+    date were already returned. Every page is an index range scan on date whatever its
+    depth, and rows saved meanwhile do not shift pages; only rows sharing a date are
+    skipped by offset, ordered among themselves by pk.
+    """
+
+    ordering = ("-date", "-pk")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
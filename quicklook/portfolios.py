@@ -0,0 +1,91 @@
+"""
+Fund-level aggregation of saved quicklook deals
+
+Every PortfolioDeal keeps the unlevered cash flow of its deal with the hash of the
+inputs and assumptions it was computed from, and the Portfolio keeps the sum of those
+cash flows with a hash of its members. A refresh hashes every member, re-evaluates in
+one batch only those whose hash moved (an edited deal or new assumptions), and re-sums
+the portfolio only when a member or the membership changed.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+
+from .analyses import query_record
+from .models import Portfolio, PortfolioDeal
+from .ro_utils import (
+    DEAL_COLUMNS,
+    DealBatch,
+    aggregate_cash_flows,
+    evaluate_batch,
+    input_hash,
+    portfolio_metrics,
+)
+
+
+def deal_hash(query, version):
+    return input_hash({name: getattr(query, name) for name in DEAL_COLUMNS}, version)
+
+
+def unpack(data):
+    """
+    A cash flow stored as float64 bytes, as an array
+    """
+    return np.frombuffer(data, dtype=np.float64)
+
+
+def refresh_portfolio(pk, assumptions):
+    """
+    Bring the cached cash flow and metrics of a portfolio up to date
+
+    Refreshes of the same portfolio are serialized on its row. A member of a region
+    missing from the assumptions raises ValueError.
+
+    Output
+    ------
+    The refreshed Portfolio
+    """
+    with transaction.atomic():
+        portfolio = Portfolio.objects.select_for_update().get(pk=pk)
+        deals = list(portfolio.deals.select_related("query").order_by("pk"))
+
+        stale = []
+        for deal in deals:
+            key = deal_hash(deal.query, assumptions.version)
+            if key != deal.input_hash:
+                deal.input_hash = key
+                stale.append(deal)
+        if stale:
+            results = evaluate_batch(
+                DealBatch.from_records(
+                    [
+                        query_record({name: getattr(deal.query, name) for name in DEAL_COLUMNS})
+                        for deal in stale
+                    ]
+                ),
+                assumptions=assumptions,
+            )
+            start = results.dates[0].date()
+            for deal, cash_flow in zip(stale, results.cash_flows):
+                deal.cash_flow_start = start
+                deal.cash_flow = cash_flow.tobytes()
+            PortfolioDeal.objects.bulk_update(
+                stale, ["input_hash", "cash_flow_start", "cash_flow"]
+            )
+
+        key = hashlib.sha256(
+            " ".join(f"{deal.pk}:{deal.input_hash}" for deal in deals).encode()
+        ).hexdigest()
+        if key != portfolio.input_hash:
+            start, cash_flow = aggregate_cash_flows(
+                [deal.cash_flow_start for deal in deals],
+                [unpack(deal.cash_flow) for deal in deals],
+            )
+            for name, value in portfolio_metrics(start, cash_flow).items():
+                setattr(portfolio, name, value)
+            portfolio.input_hash = key
+            portfolio.cash_flow_start = start
+            portfolio.cash_flow = cash_flow.tobytes()
+            portfolio.save()
+    return portfolio
@@ -1,19 +1,161 @@
 import datetime
-import pandas as pd
+import hashlib
+import json
 import numpy as np
-from dataclasses import dataclass
-from pyxirr import xirr
+from dataclasses import dataclass, field, fields
 from datetime import date
-from enum import Enum
+from typing import TYPE_CHECKING
 from dateutil.relativedelta import relativedelta
-import numpy_financial as npf
 
-pd.set_option("display.max_columns", None)
-pd.set_option("display.max_rows", None)
-pd.set_option("display.float_format", "{:.0f}".format)
+"""
+pandas is only imported where a dataframe or a DatetimeIndex is built, so that
+importing the engine (and with it Django startup) does not pay for it
+"""
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+"""
+CORE ASSUMPTIONS
+"""
+MASS_GRADING_LENGTH = 2
+VERTICAL_CONSTRUCTION_LENGTH = 8
+MASS_GRADING_PROPORTION = 0.25
+RENTAL_COSTS = 0.25
+TENANT_REP_COMMISSION_PC = 0.265
+LANDLORD_REP_COMMISSION_PC = 0.017
+EXPENSE_SLIPPAGE_PC = 0.017
+DEVELOPMENT_FEE_PC = 0.04
+
+
+@dataclass(frozen=True)
+class RegionAssumptions:
+    """
+    The market assumptions of one region
+
+    Parameters
+    ----------
+    rent_periods_per_year : int
+        1 where rent is quoted per year, 12 where it is quoted per month
+    debt_fees_pc: float
+        Debt fees, as a proportion of the unlevered cost
+    disposition_pc: float
+        Disposition cost, as a proportion of the gross sale price
+    """
+
+    rent_periods_per_year: int
+    debt_fees_pc: float
+    disposition_pc: float
+    tenant_rep_commission_pc: float = TENANT_REP_COMMISSION_PC
+    landlord_rep_commission_pc: float = LANDLORD_REP_COMMISSION_PC
+    rental_costs: float = RENTAL_COSTS
+    mass_grading_proportion: float = MASS_GRADING_PROPORTION
+
+
+ASSUMPTION_FIELDS = tuple(assumption.name for assumption in fields(RegionAssumptions))
+
+
+@dataclass(frozen=True)
+class AssumptionTable:
+    """
+    RegionAssumptions by region, as one immutable version
+
+    Every assumption is also held as an array over the regions in sorted order, so
+    that gather looks up the assumptions of a whole batch with one search.
+
+    Parameters
+    ----------
+    version : int
+        The AssumptionSet the table was loaded from, 0 for DEFAULT_ASSUMPTIONS
+    assumptions: mapping
+        The RegionAssumptions of each region
+    """
+
+    version: int
+    assumptions: dict
+    regions: np.ndarray = field(init=False, repr=False, compare=False)
+    columns: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        regions = sorted(self.assumptions)
+        object.__setattr__(self, "assumptions", dict(self.assumptions))
+        object.__setattr__(self, "regions", np.array(regions, dtype=str))
+        object.__setattr__(
+            self,
+            "columns",
+            {
+                name: np.array([getattr(self.assumptions[region], name) for region in regions])
+                for name in ASSUMPTION_FIELDS
+            },
+        )
+
+    def __contains__(self, region):
+        return region in self.assumptions
+
+    def __getitem__(self, region):
+        try:
+            return self.assumptions[region]
+        except KeyError:
+            raise ValueError(f"There are no assumptions for the region {region!r}") from None
+
+    def gather(self, regions):
+        """
+        Output
+        ------
+        A dictionary holding an array of every assumption over the given regions
+        """
+        regions = np.asarray(regions, dtype=str)
+        if not len(self.regions):
+            index = np.zeros(len(regions), dtype=np.int64)
+            unknown = np.ones(len(regions), dtype=bool)
+        else:
+            index = np.minimum(np.searchsorted(self.regions, regions), len(self.regions) - 1)
+            unknown = self.regions[index] != regions
+        if unknown.any():
+            raise ValueError(
+                "There are no assumptions for the regions "
+                + ", ".join(repr(region) for region in np.unique(regions[unknown]))
+            )
+        return {name: column[index] for name, column in self.columns.items()}
+
+
+"""
+Built-in assumptions, used when none are stored in the database. Rent is quoted per
+year in the UK and US and per month in Poland and Germany.
+"""
+DEFAULT_ASSUMPTIONS = AssumptionTable(
+    version=0,
+    assumptions={
+        "UK": RegionAssumptions(
+            rent_periods_per_year=1, debt_fees_pc=0.11, disposition_pc=0.0935
+        ),
+        "US": RegionAssumptions(
+            rent_periods_per_year=1, debt_fees_pc=0.038, disposition_pc=0.05
+        ),
+        "Poland": RegionAssumptions(
+            rent_periods_per_year=12, debt_fees_pc=0.038, disposition_pc=0.05
+        ),
+        "Germany": RegionAssumptions(
+            rent_periods_per_year=12, debt_fees_pc=0.038, disposition_pc=0.05
+        ),
+    },
+)
 
 
 class KeyDates:
+    __slots__ = (
+        "land_purchase_date",
+        "mass_grading_start",
+        "mass_grading_end",
+        "vertical_construction_begin",
+        "vertical_construction_end",
+        "building_sale",
+        "rent_free_period",
+        "lease_up_period",
+        "rent_start_estimate",
+        "rent_end_estimate",
+    )
+
     def __init__(
         self,
         land_purchase_date,
@@ -22,12 +164,6 @@ class KeyDates:
         rent_free_period,
         lease_up_period,
     ):
-        """
-        CORE ASSUMPTIONS
-        """
-        MASS_GRADING_LENGTH = 2
-        VERTICAL_CONSTRUCTION_LENGTH = 8
-
         self.land_purchase_date = land_purchase_date
         self.mass_grading_start = mass_grading_start
         self.mass_grading_end = mass_grading_start + relativedelta(
@@ -39,14 +175,46 @@ class KeyDates:
             + relativedelta(months=VERTICAL_CONSTRUCTION_LENGTH)
         )
         self.building_sale = building_sale
+        self.rent_free_period = rent_free_period
+        self.lease_up_period = lease_up_period
         self.rent_start_estimate = self.vertical_construction_end + relativedelta(
             months=(rent_free_period + lease_up_period)
         )
         self.rent_end_estimate = self.building_sale
 
+    def record(self):
+        """
+        The inputs the key dates were built from, named as the DealBatch columns
+        """
+        return {name: getattr(self, name) for name in DEAL_DATE_COLUMNS + DEAL_PERIOD_COLUMNS}
+
 
-@dataclass
 class DealValues:
+    __slots__ = (
+        "region",
+        "assumptions",
+        "rent_per_unit_area",
+        "annual_rent",
+        "exit_cap_pc",
+        "exit_cap",
+        "total_area",
+        "building_hard_cost_per_unit_area",
+        "building_hard_cost",
+        "building_soft_cost_per_unit_area",
+        "building_soft_cost",
+        "cash_contributions",
+        "total_levered_cost_multiple",
+        "tenant_improvements_per_unit_area",
+        "tenant_improvements",
+        "tenant_rep_commission",
+        "landlord_rep_commission",
+        "expense_slippage",
+        "land_cost",
+        "development_fee",
+        "gross_sale_price",
+        "disposition_cost",
+    )
+
     def __init__(
         self,
         exit_cap,
@@ -58,49 +226,30 @@ class DealValues:
         total_area,
         rent_per_unit_area,
         region,
+        assumptions=DEFAULT_ASSUMPTIONS,
     ):
         self.region = region
+        self.assumptions = market = assumptions[region]
         self.rent_per_unit_area = rent_per_unit_area
         """
         Handle whether monthly or annual rent is used
         """
-        if region == "UK":
-            annual_rent = total_area * rent_per_unit_area
-        elif region == "US":
-            annual_rent = total_area * rent_per_unit_area
-        elif region == "Poland":
-            annual_rent = total_area * rent_per_unit_area * 12
-        elif region == "Germany":
-            annual_rent = total_area * rent_per_unit_area * 12
-        else:
-            annual_rent = 0
+        annual_rent = total_area * rent_per_unit_area * market.rent_periods_per_year
         self.annual_rent = annual_rent
+        self.exit_cap_pc = exit_cap
         self.exit_cap = exit_cap / 100
         self.total_area = total_area
+        self.building_hard_cost_per_unit_area = building_hard_cost
         self.building_hard_cost = building_hard_cost * total_area
+        self.building_soft_cost_per_unit_area = building_soft_cost
         self.building_soft_cost = building_soft_cost * total_area
         self.cash_contributions = cash_contributions
 
-        """
-        CORE ASSUMPTIONS
-        """
-
-        TENANT_REP_COMMISSION_PC = 0.265
-        LANDLORD_REP_COMMISSION_PC = 0.017
-        EXPENSE_SLIPPAGE_PC = 0.017
-        DEVELOPMENT_FEE_PC = 0.04
-
-        if region == "UK":
-            DEBT_FEES_PC = 0.11
-            DISPOSITION_PC = 0.0935
-        else:
-            DEBT_FEES_PC = 0.038
-            DISPOSITION_PC = 0.05
-    
-        self.total_levered_cost_multiple = DEBT_FEES_PC
+        self.total_levered_cost_multiple = market.debt_fees_pc
+        self.tenant_improvements_per_unit_area = tenant_improvements
         self.tenant_improvements = tenant_improvements * total_area
-        self.tenant_rep_commission = annual_rent * TENANT_REP_COMMISSION_PC
-        self.landlord_rep_commission = annual_rent * LANDLORD_REP_COMMISSION_PC
+        self.tenant_rep_commission = annual_rent * market.tenant_rep_commission_pc
+        self.landlord_rep_commission = annual_rent * market.landlord_rep_commission_pc
         self.expense_slippage = (
             self.building_hard_cost + self.building_soft_cost
         ) * EXPENSE_SLIPPAGE_PC
@@ -109,7 +258,23 @@ class DealValues:
             self.building_soft_cost + self.building_hard_cost
         ) * DEVELOPMENT_FEE_PC
         self.gross_sale_price = annual_rent / self.exit_cap
-        self.disposition_cost = self.gross_sale_price * DISPOSITION_PC
+        self.disposition_cost = self.gross_sale_price * market.disposition_pc
+
+    def record(self):
+        """
+        The inputs the values were built from, named as the DealBatch columns
+        """
+        return {
+            "exit_cap": self.exit_cap_pc,
+            "building_hard_cost": self.building_hard_cost_per_unit_area,
+            "building_soft_cost": self.building_soft_cost_per_unit_area,
+            "tenant_improvements": self.tenant_improvements_per_unit_area,
+            "cash_contributions": self.cash_contributions,
+            "land_cost": self.land_cost,
+            "total_area": self.total_area,
+            "rent_per_unit_area": self.rent_per_unit_area,
+            "region": self.region,
+        }
 
 
 @dataclass
@@ -172,20 +337,516 @@ def add_income(data, income: Budget):
     ] = income.budget
 
 
+"""
+The cash flow runs monthly from the first of the month of the deal's earliest key date,
+over the horizon of CASH_FLOW_MONTHS months unless its last cash flow falls later
+"""
+CASH_FLOW_MONTHS = 120 + 1
+
+"""
+Line items of the cash flow, in the order of the dataframe columns after "Date"
+"""
+LINE_ITEMS = (
+    "Land Purchase",
+    "Mass Grading",
+    "Vertical Construction",
+    "Total Hard Cost",
+    "Building Soft Cost",
+    "Development Fee",
+    "Tenant Improvements",
+    "Tenant Rep Commission",
+    "Landlord Rep Commission",
+    "Cash Contributions",
+    "Expense Slippage",
+    "Total Unlevered Cost",
+    "Rental Income",
+    "Building Sale",
+    "Disposition Cost",
+    "Total Revenue",
+    "Unlevered Cash Flow",
+    "Cum Unlevered Cash Flow",
+)
+LINE_ITEM_ROWS = {name: row for row, name in enumerate(LINE_ITEMS)}
+
+"""
+Deal inputs each line item depends on, through its amount or its timing. Rent start
+moves with the end of construction and with the rent free and lease up periods, and the
+region brings the market assumptions. The totals are left out: they only depend on the
+line items of CASH_FLOW_TOTALS
+"""
+RENT_START_INPUTS = ("mass_grading_start", "rent_free_period", "lease_up_period")
+LINE_ITEM_INPUTS = {
+    "Land Purchase": ("land_purchase_date", "land_cost"),
+    "Mass Grading": ("mass_grading_start", "building_hard_cost", "total_area", "region"),
+    "Vertical Construction": (
+        "mass_grading_start",
+        "building_hard_cost",
+        "total_area",
+        "region",
+    ),
+    "Building Soft Cost": (
+        "land_purchase_date",
+        "mass_grading_start",
+        "building_soft_cost",
+        "total_area",
+    ),
+    "Development Fee": (
+        "mass_grading_start",
+        "building_hard_cost",
+        "building_soft_cost",
+        "total_area",
+    ),
+    "Tenant Improvements": RENT_START_INPUTS + ("tenant_improvements", "total_area"),
+    "Tenant Rep Commission": RENT_START_INPUTS
+    + ("rent_per_unit_area", "total_area", "region"),
+    "Landlord Rep Commission": RENT_START_INPUTS
+    + ("rent_per_unit_area", "total_area", "region"),
+    "Cash Contributions": RENT_START_INPUTS + ("cash_contributions",),
+    "Expense Slippage": RENT_START_INPUTS
+    + ("building_hard_cost", "building_soft_cost", "total_area"),
+    "Rental Income": RENT_START_INPUTS
+    + ("building_sale", "rent_per_unit_area", "total_area", "region"),
+    "Building Sale": ("building_sale", "exit_cap", "rent_per_unit_area", "total_area", "region"),
+    "Disposition Cost": (
+        "building_sale",
+        "exit_cap",
+        "rent_per_unit_area",
+        "total_area",
+        "region",
+    ),
+}
+
+"""
+The line items each total adds up, in the order they are added, and in the order the
+totals are computed. "Cum Unlevered Cash Flow" is the running sum of "Unlevered Cash Flow"
+"""
+CASH_FLOW_TOTALS = {
+    "Total Hard Cost": ("Mass Grading", "Vertical Construction"),
+    "Total Unlevered Cost": (
+        "Land Purchase",
+        "Mass Grading",
+        "Vertical Construction",
+        "Development Fee",
+        "Building Soft Cost",
+        "Tenant Improvements",
+        "Tenant Rep Commission",
+        "Landlord Rep Commission",
+        "Expense Slippage",
+        "Cash Contributions",
+    ),
+    "Total Revenue": ("Building Sale", "Disposition Cost", "Rental Income"),
+    "Unlevered Cash Flow": ("Total Revenue", "Total Unlevered Cost"),
+}
+
+
+def dependent_line_items(inputs):
+    """
+    The line items (totals excluded) that have to be recomputed when inputs change
+    """
+    inputs = set(inputs)
+    return tuple(
+        name for name, depends_on in LINE_ITEM_INPUTS.items() if inputs.intersection(depends_on)
+    )
+
+
+def month_offset(start, when):
+    """
+    The number of whole months from the month of start to the month of when
+    """
+    return (when.year - start.year) * 12 + (when.month - start.month)
+
+
+def first_month_on_or_after(start, when):
+    """
+    The offset of the first month-start date of the cash flow that is not before when
+    """
+    offset = month_offset(start, when)
+    if when.day != 1 or (
+        isinstance(when, datetime.datetime) and when.time() != datetime.time()
+    ):
+        offset += 1
+    return offset
+
+
+def cash_flow_timeline(key_dates: KeyDates, horizon=CASH_FLOW_MONTHS):
+    """
+    The first month and the length of the cash flow of a deal
+
+    The cash flow starts on the first of the month of the earliest key date and runs
+    for horizon months, extended to the month after rent starts or to the sale when
+    either falls later, so that it only depends on the deal and never drops a cash
+    flow.
+
+    Output
+    ------
+    The first month as a date and the number of months
+    """
+    first = min(
+        key_dates.land_purchase_date,
+        key_dates.mass_grading_start,
+        key_dates.building_sale,
+    )
+    start = date(first.year, first.month, 1)
+    last = max(
+        month_offset(start, key_dates.building_sale),
+        month_offset(start, key_dates.rent_start_estimate) + 1,
+    )
+    return start, max(horizon, last + 1)
+
+
+def month_start_array(start, months=CASH_FLOW_MONTHS):
+    """
+    The dates of the cash flow as a datetime64[M] array, without pandas
+    """
+    return np.datetime64(start, "M") + np.arange(months)
+
+
+def month_starts(start, months=CASH_FLOW_MONTHS):
+    """
+    The dates of the cash flow: the first of every month from start
+
+    Built with datetime64 month arithmetic, which is much faster than
+    pd.date_range(freq="MS") and gives the same dates.
+    """
+    import pandas as pd
+
+    return pd.DatetimeIndex(month_start_array(start, months).astype("datetime64[ns]"))
+
+
+class CashFlow:
+    """
+    The monthly cash flow of a deal
+
+    Line items are rows of one float64 array and months are its columns, so each
+    Budget is a slice assignment on integer month offsets from start. A dataframe
+    is only built when to_frame is called.
+
+    Parameters
+    ----------
+    start : date
+        The first of the month of the first column
+    months: int
+        The number of months in the cash flow
+    """
+
+    __slots__ = ("start", "data")
+
+    def __init__(self, start, months):
+        self.start = start
+        self.data = np.zeros((len(LINE_ITEMS), months))
+
+    def __getitem__(self, name):
+        return self.data[LINE_ITEM_ROWS[name]]
+
+    def __setitem__(self, name, value):
+        self.data[LINE_ITEM_ROWS[name]] = value
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def month_index(self, when):
+        """
+        The column of the month containing when, or None when it is outside the cash flow
+        """
+        index = month_offset(self.start, when)
+        return index if 0 <= index < len(self) else None
+
+    def add_payment(self, name, when, amount):
+        """
+        Put a one-off amount on the month containing when
+        """
+        index = self.month_index(when)
+        if index is not None:
+            self[name][index] = amount
+
+    def _fill(self, name, start, end, amount):
+        first = max(first_month_on_or_after(self.start, start), 0)
+        last = min(month_offset(self.start, end), len(self) - 1)
+        if first <= last:
+            self[name][first : last + 1] = amount
+
+    def apply_budget(self, budget: Budget):
+        """
+        Array counterpart of apply_budget: split the cost evenly over its months
+        """
+        budget_length = month_offset(budget.start, budget.end) + 1
+        self._fill(budget.name, budget.start, budget.end, -budget.budget / budget_length)
+
+    def add_income(self, income: Budget):
+        """
+        Array counterpart of add_income: the same income in every month of the period
+        """
+        self._fill(income.name, income.start, income.end, income.budget)
+
+    def dates(self):
+        return month_starts(self.start, len(self))
+
+    def to_frame(self):
+        """
+        Output
+        ------
+        The cash flow as a dataframe with a "Date" column followed by the line items
+        """
+        import pandas as pd
+
+        df = pd.DataFrame(self.data.T, columns=list(LINE_ITEMS))
+        df.insert(0, "Date", self.dates())
+        return df
+
+
+"""
+IRR SOLVER
+
+Rates are solved for as x = log(1 + rate), which keeps every rate above -100% and turns
+the discount factors into exponentials. Roots are bracketed between IRR_BRACKET rates.
+"""
+IRR_BRACKET = (-0.99, 100.0)
+IRR_MAX_ITERATIONS = 100
+IRR_TOLERANCE = 1e-12
+
+
+@dataclass
+class IRRSolution:
+    """
+    The IRR of each cash flow of a batch
+
+    rate is NaN wherever converged is False: the cash flow does not change sign
+    within IRR_BRACKET, or the iteration budget ran out before the root was found.
+    """
+
+    rate: np.ndarray
+    converged: np.ndarray
+    iterations: int
+
+
+def year_fractions(dates):
+    """
+    The time of each date from the first one, in years of 365 days as used by XIRR
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    return (days - days[0]).astype(np.float64) / 365
+
+
+def xirr_batch(values, times, max_iterations=IRR_MAX_ITERATIONS, tolerance=IRR_TOLERANCE):
+    """
+    Solve the IRR of many cash flows at once with bracketed Newton iterations
+
+    Every row is first bracketed between the IRR_BRACKET rates. Each iteration takes a
+    Newton step on the rows still being solved, falls back to bisection whenever the
+    step leaves the bracket, and then narrows the bracket around the root.
+
+    Parameters
+    ----------
+    values : array
+        Cash flows, one row per deal and one column per payment
+    times: array
+        The time of every column, in years for XIRR or in periods for a periodic IRR
+    max_iterations: int
+        The fixed iteration budget shared by all rows
+    tolerance: float
+        The largest step in log(1 + rate) that counts as converged
+
+    Output
+    ------
+    IRRSolution with the rate and convergence flag of every row
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    times = np.asarray(times, dtype=np.float64)
+    scale = np.abs(values).max(axis=1, keepdims=True)
+    empty = scale[:, 0] == 0
+    scale[empty] = 1
+    values = values / scale
+
+    def npv(rows, x):
+        discounted = values[rows] * np.exp(-x[:, None] * times)
+        return discounted.sum(axis=1), -(discounted * times).sum(axis=1)
+
+    count = len(values)
+    everything = np.arange(count)
+    low = np.full(count, np.log1p(IRR_BRACKET[0]))
+    high = np.full(count, np.log1p(IRR_BRACKET[1]))
+    with np.errstate(over="ignore", invalid="ignore"):
+        f_low = npv(everything, low)[0]
+        f_high = npv(everything, high)[0]
+    bracketed = np.sign(f_low) * np.sign(f_high) < 0
+    converged = ((f_low == 0) | (f_high == 0)) & ~empty
+
+    """
+    Start from the rate that grows the money out over the time between the weighted
+    average outflow and inflow, which is close to the IRR of a development deal
+    """
+    inflow = np.clip(values, 0, None)
+    outflow = np.clip(-values, 0, None)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        guess = np.log(inflow.sum(axis=1) / outflow.sum(axis=1)) / (
+            (inflow * times).sum(axis=1) / inflow.sum(axis=1)
+            - (outflow * times).sum(axis=1) / outflow.sum(axis=1)
+        )
+    guess = np.where(np.isfinite(guess), np.clip(guess, low, high), np.log1p(0.1))
+    x = np.where(f_low == 0, low, np.where(f_high == 0, high, guess))
+
+    active = np.flatnonzero(bracketed & ~converged)
+    iterations = 0
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        while len(active) and iterations < max_iterations:
+            iterations += 1
+            f, slope = npv(active, x[active])
+
+            below = np.sign(f) == np.sign(f_low[active])
+            low[active] = np.where(below, x[active], low[active])
+            f_low[active] = np.where(below, f, f_low[active])
+            high[active] = np.where(below, high[active], x[active])
+
+            step = x[active] - f / slope
+            inside = np.isfinite(step) & (step >= low[active]) & (step <= high[active])
+            following = np.where(inside, step, (low[active] + high[active]) / 2)
+
+            root = f == 0
+            done = root | (np.abs(following - x[active]) <= tolerance)
+            x[active] = np.where(root, x[active], following)
+            converged[active[done]] = True
+            active = active[~done]
+
+    rate = np.where(converged, np.expm1(x), np.nan)
+    return IRRSolution(rate=rate, converged=converged, iterations=iterations)
+
+
+def irr_batch(values, **kwargs):
+    """
+    The periodic IRR of many cash flows at once, one payment per period
+    """
+    values = np.atleast_2d(values)
+    return xirr_batch(values, np.arange(values.shape[1]), **kwargs)
+
+
 @dataclass
 class QuicklookInputs:
+    """
+    A single deal and its cash flow
+
+    The cash flow is built once, on the first metric that needs it, and reused by every
+    other metric. Assigning new ``key_dates``, ``values`` or ``horizon`` drops it; after
+    changing the dates or values in place call ``invalidate_cash_flow``.
+
+    The cash flow runs over the deal's own timeline (see cash_flow_timeline), so the
+    same inputs always give the same results.
+    """
+
     name: str
     key_dates: KeyDates
     values: DealValues
+    horizon: int = CASH_FLOW_MONTHS
+    _cash_flow: CashFlow = field(default=None, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        if name in ("key_dates", "values", "horizon"):
+            object.__setattr__(self, "_cash_flow", None)
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_record(cls, record, assumptions=DEFAULT_ASSUMPTIONS):
+        """
+        Build the inputs from a mapping holding the name and every DEAL_COLUMNS input,
+        such as validated QuickLookQuery data
+        """
+        return cls(
+            name=record["name"],
+            key_dates=KeyDates(
+                land_purchase_date=record["land_purchase_date"],
+                mass_grading_start=record["mass_grading_start"],
+                building_sale=record["building_sale"],
+                rent_free_period=record["rent_free_period"],
+                lease_up_period=record["lease_up_period"],
+            ),
+            values=DealValues(
+                exit_cap=record["exit_cap"],
+                building_hard_cost=record["building_hard_cost"],
+                building_soft_cost=record["building_soft_cost"],
+                tenant_improvements=record["tenant_improvements"],
+                cash_contributions=record["cash_contributions"],
+                land_cost=record["land_cost"],
+                total_area=record["total_area"],
+                rent_per_unit_area=record["rent_per_unit_area"],
+                region=record["region"],
+                assumptions=assumptions,
+            ),
+        )
+
+    def invalidate_cash_flow(self):
+        """
+        Forget the memoized cash flow so that the next metric rebuilds it
+        """
+        self._cash_flow = None
+
+    def update(self, assumptions=None, **changes):
+        """
+        Change some inputs of the deal, keeping the memoized cash flow up to date
+
+        Only the line items that depend on the changed inputs (see LINE_ITEM_INPUTS) are
+        recomputed, followed by the totals that add them up and the running sum from the
+        first month that moved, in place. The result is the same as a full rebuild. When
+        the change moves the start or the length of the cash flow, or nothing was built
+        yet, the cash flow is left to be built afresh by the next metric.
+
+        Parameters
+        ----------
+        assumptions : AssumptionTable
+            The table to look a new region up in, DEFAULT_ASSUMPTIONS when None. The
+            deal keeps its own market assumptions while its region does not change
+        changes:
+            New values of DEAL_COLUMNS inputs
+
+        Output
+        ------
+        The line items that were recomputed, or all of them for a fresh build, totals
+        excluded
+        """
+        unknown = set(changes).difference(DEAL_COLUMNS)
+        if unknown:
+            raise TypeError(f"Unknown deal inputs: {', '.join(sorted(unknown))}")
+
+        cash_flow = self._cash_flow
+        date_columns = DEAL_DATE_COLUMNS + DEAL_PERIOD_COLUMNS
+        if not changes.keys().isdisjoint(date_columns):
+            record = {**self.key_dates.record(), **changes}
+            object.__setattr__(
+                self, "key_dates", KeyDates(**{name: record[name] for name in date_columns})
+            )
+            timeline = cash_flow_timeline(self.key_dates, self.horizon)
+            if cash_flow is not None and timeline != (cash_flow.start, len(cash_flow)):
+                cash_flow = self._cash_flow = None
+        if not changes.keys().isdisjoint(DEAL_VALUE_COLUMNS + ("region",)):
+            if "region" in changes:
+                table = DEFAULT_ASSUMPTIONS if assumptions is None else assumptions
+            else:
+                table = {self.values.region: self.values.assumptions}
+            record = {**self.values.record(), **changes}
+            object.__setattr__(
+                self,
+                "values",
+                DealValues(
+                    **{name: record[name] for name in DEAL_VALUE_COLUMNS + ("region",)},
+                    assumptions=table,
+                ),
+            )
+        if cash_flow is None:
+            return tuple(LINE_ITEM_INPUTS)
+
+        line_items = dependent_line_items(changes)
+        self._fill_line_items(cash_flow, line_items)
+        self._add_totals(cash_flow, line_items)
+        return line_items
+
+    def cash_flow_start(self):
+        return cash_flow_timeline(self.key_dates, self.horizon)[0]
 
     def cash_flow_dates(self):
         """
-        Generate date array for the cash flow which is 180 months = 15 years long
+        Generate date array for the cash flow, horizon months (a little over 10 years)
+        from the first month of the deal or up to its last cash flow
         """
 
-        return pd.date_range(
-            start=date.today() - relativedelta(months=50), periods=120 + 1, freq="MS"
-        )
+        return month_starts(*cash_flow_timeline(self.key_dates, self.horizon))
 
     def annual_rental_income(self):
         """
@@ -210,7 +871,132 @@ class QuicklookInputs:
         except:
             return 0
 
+    def cash_flow(self):
+        """
+        Output
+        ------
+        The monthly cash flow as a CashFlow array, built on first use and then memoized.
+        The same array is shared by every metric, so treat it as read only.
+        """
+        if self._cash_flow is None:
+            self._cash_flow = self._build_cash_flow()
+        return self._cash_flow
+
     def uses_cash_flow(self):
+        """
+        Output
+        ------
+        The monthly cash flow as a dataframe
+        """
+        return self.cash_flow().to_frame()
+
+    def _build_cash_flow(self):
+        cash_flow = CashFlow(*cash_flow_timeline(self.key_dates, self.horizon))
+        self._fill_line_items(cash_flow, tuple(LINE_ITEM_INPUTS))
+        self._add_totals(cash_flow, tuple(LINE_ITEM_INPUTS))
+        return cash_flow
+
+    def _fill_line_items(self, cash_flow, names):
+        """
+        (Re)compute the named line items of cash_flow from the current key dates and values
+        """
+        key_dates = self.key_dates
+        values = self.values
+        mass_grading = values.building_hard_cost * values.assumptions.mass_grading_proportion
+        rent_start = key_dates.rent_start_estimate
+        rent_paid = rent_start + relativedelta(months=1)
+        payments = {
+            "Land Purchase": (key_dates.land_purchase_date, -values.land_cost),
+            "Building Sale": (key_dates.building_sale, values.gross_sale_price),
+            "Disposition Cost": (key_dates.building_sale, -values.disposition_cost),
+        }
+        budgets = {
+            "Mass Grading": (
+                key_dates.mass_grading_start,
+                key_dates.mass_grading_end,
+                mass_grading,
+            ),
+            "Vertical Construction": (
+                key_dates.vertical_construction_begin,
+                key_dates.vertical_construction_end,
+                values.building_hard_cost - mass_grading,
+            ),
+            "Building Soft Cost": (
+                key_dates.land_purchase_date,
+                key_dates.mass_grading_start,
+                values.building_soft_cost,
+            ),
+            "Tenant Improvements": (rent_start, rent_paid, values.tenant_improvements),
+            "Tenant Rep Commission": (rent_start, rent_paid, values.tenant_rep_commission),
+            "Landlord Rep Commission": (rent_start, rent_paid, values.landlord_rep_commission),
+            "Cash Contributions": (rent_start, rent_paid, values.cash_contributions),
+            "Expense Slippage": (
+                key_dates.vertical_construction_end,
+                rent_start,
+                values.expense_slippage,
+            ),
+            "Development Fee": (
+                key_dates.mass_grading_start,
+                key_dates.vertical_construction_end,
+                values.development_fee,
+            ),
+        }
+        for name in names:
+            cash_flow[name] = 0
+            if name in payments:
+                cash_flow.add_payment(name, *payments[name])
+            elif name == "Rental Income":
+                cash_flow.add_income(
+                    Budget(
+                        name=name,
+                        start=rent_start,
+                        end=key_dates.rent_end_estimate,
+                        budget=self.monthly_rental_income()
+                        * (1 - values.assumptions.rental_costs),
+                    )
+                )
+            else:
+                cash_flow.apply_budget(Budget(name, *budgets[name]))
+
+    @staticmethod
+    def _add_totals(cash_flow, changed):
+        """
+        Recompute the totals that depend on the changed line items, and the running sum of
+        the unlevered cash flow from the first month that changed
+        """
+        changed = set(changed)
+        previous = cash_flow["Unlevered Cash Flow"].copy()
+        for total, line_items in CASH_FLOW_TOTALS.items():
+            if changed.isdisjoint(line_items):
+                continue
+            row = cash_flow[total]
+            np.add(cash_flow[line_items[0]], cash_flow[line_items[1]], out=row)
+            for name in line_items[2:]:
+                row += cash_flow[name]
+            changed.add(total)
+
+        moved = np.flatnonzero(cash_flow["Unlevered Cash Flow"] != previous)
+        if not len(moved):
+            return
+        first = moved[0]
+        cumulative = cash_flow["Cum Unlevered Cash Flow"]
+        if first == 0:
+            np.cumsum(cash_flow["Unlevered Cash Flow"], out=cumulative)
+        else:
+            """
+            Carry on from the last unchanged month, adding in the same order as a full cumsum
+            """
+            cumulative[first - 1 :] = np.cumsum(
+                np.concatenate(
+                    (cumulative[first - 1 : first], cash_flow["Unlevered Cash Flow"][first:])
+                )
+            )
+
+    def uses_cash_flow_pandas(self):
+        """
+        Reference implementation of uses_cash_flow, building the dataframe column by
+        column with pandas. Kept to test and benchmark the CashFlow engine against.
+        """
         # ===============================================================================
         # LAND PURCHASE
         # ===============================================================================
@@ -219,6 +1005,8 @@ class QuicklookInputs:
         Initialise dataframe with dates
         """
 
+        import pandas as pd
+
         df = pd.DataFrame(self.cash_flow_dates(), columns=["Date"])
 
         """
@@ -245,8 +1033,9 @@ class QuicklookInputs:
         df["Total Hard Cost"] = np.zeros(len(df))
         df["Building Soft Cost"] = np.zeros(len(df))
         df["Development Fee"] = np.zeros(len(df))
-        MASS_GRADING_PROPORTION = 0.25
-        mass_grading = self.values.building_hard_cost * MASS_GRADING_PROPORTION
+        mass_grading = (
+            self.values.building_hard_cost * self.values.assumptions.mass_grading_proportion
+        )
         remaining_hard_costs = self.values.building_hard_cost - mass_grading
 
         """
@@ -376,8 +1165,7 @@ class QuicklookInputs:
         # ===============================================================================
 
         monthly_rental_income = self.monthly_rental_income()
-        RENTAL_COSTS = 0.25
-        net_rent = monthly_rental_income * (1 - RENTAL_COSTS)
+        net_rent = monthly_rental_income * (1 - self.values.assumptions.rental_costs)
         add_income(
             data=df,
             income=Budget(
@@ -446,7 +1234,9 @@ class QuicklookInputs:
         The unlevered cash flow as a slice of the dataframe
         """
 
-        return self.uses_cash_flow()["Unlevered Cash Flow"]
+        import pandas as pd
+
+        return pd.Series(self.cash_flow()["Unlevered Cash Flow"], name="Unlevered Cash Flow")
 
     def unlevered_ncf(self):
         """
@@ -454,7 +1244,7 @@ class QuicklookInputs:
         ------
         The sum of the unlvered cash flows
         """
-        return self.uses_cash_flow()["Unlevered Cash Flow"].sum()
+        return self.cash_flow()["Unlevered Cash Flow"].sum()
 
     def total_unlevered_cost(self):
         """
@@ -462,7 +1252,7 @@ class QuicklookInputs:
         ------
         The sum of all of the unlevered costs.
         """
-        return self.uses_cash_flow()["Total Unlevered Cost"].sum()
+        return self.cash_flow()["Total Unlevered Cost"].sum()
 
     def total_levered_cost(self):
         """
@@ -503,7 +1293,7 @@ class QuicklookInputs:
         The minimum value on the cumulative unlevered cash flow
 
         """
-        return self.uses_cash_flow()["Cum Unlevered Cash Flow"].min()
+        return self.cash_flow()["Cum Unlevered Cash Flow"].min()
 
     def net_sale_price(self):
         """
@@ -517,10 +1307,8 @@ class QuicklookInputs:
         Net Sale Price
 
         """
-        return (
-            self.uses_cash_flow()["Disposition Cost"].sum()
-            + self.uses_cash_flow()["Building Sale"].sum()
-        )
+        cash_flow = self.cash_flow()
+        return cash_flow["Disposition Cost"].sum() + cash_flow["Building Sale"].sum()
 
     def unlevered_em(self):
         """
@@ -540,19 +1328,38 @@ class QuicklookInputs:
         else:
             return 0
 
+    def results(self):
+        """
+        Output
+        ------
+        Every metric, keyed by the RESULT_FIELDS they are stored in
+        """
+        return {
+            "unlevered_irr": self.unlevered_irr(),
+            "unlevered_mult": float(self.unlevered_em()),
+            "yoc": float(self.yoc()),
+            "ncf": float(self.unlevered_ncf()),
+            "unl_costs": float(self.total_unlevered_cost()),
+            "lev_costs": float(self.total_levered_cost()),
+            "unl_peak_equity": float(self.unlevered_peak_equity()),
+            "net_sale_price": float(self.net_sale_price()),
+            "gross_sale_price": float(self.values.gross_sale_price),
+        }
+
     def unlevered_irr(self):
         """
         Output
         ------
-        The unlevered IRR using PyXirr
+        The unlevered IRR (XIRR over the cash flow dates) using xirr_batch, or None
+        when the cash flow has no IRR
 
         """
-        dates = self.cash_flow_dates()
-        values = self.unlevered_cash_flow()
-        try:
-            return xirr(dates, values)
-        except:
-            return 0
+        cash_flow = self.cash_flow()
+        solution = xirr_batch(
+            cash_flow["Unlevered Cash Flow"],
+            year_fractions(month_start_array(cash_flow.start, len(cash_flow))),
+        )
+        return float(solution.rate[0]) if solution.converged[0] else None
 
     def start_date_index(self):
         """
@@ -561,8 +1368,7 @@ class QuicklookInputs:
         The pandas index of the first land purchase month in the cash flow
 
         """
-        df = self.uses_cash_flow()
-        return df.index[df["Date"] == self.key_dates.land_purchase_date]
+        return self._date_index(self.key_dates.land_purchase_date)
 
     def end_date_index(self):
         """
@@ -571,20 +1377,644 @@ class QuicklookInputs:
         The pandas index of the first land purchase month in the cash flow
 
         """
-        df = self.uses_cash_flow()
-        return df.index[df["Date"] == self.key_dates.building_sale]
+        return self._date_index(self.key_dates.building_sale)
+
+    def _date_index(self, when):
+        import pandas as pd
+
+        cash_flow = self.cash_flow()
+        index = cash_flow.month_index(when)
+        if index is None or first_month_on_or_after(cash_flow.start, when) != index:
+            return pd.Index([], dtype="int64")
+        return pd.Index([index], dtype="int64")
 
     def unlevered_irr_numpy(self):
         """
         Output
         ------
-        The unlevered IRR using numpy-financial
+        The periodic IRR from land purchase to building sale using irr_batch, or
+        None when it has no IRR
+
+        """
+        start = self.start_date_index()
+        end = self.end_date_index()
+        if start.empty or end.empty:
+            return None
+        solution = irr_batch(self.cash_flow()["Unlevered Cash Flow"][start[0] : end[0]])
+        return float(solution.rate[0]) * 10 if solution.converged[0] else None
+
+
+"""
+Columns of a DealBatch, named after the QuickLookQuery fields they are read from
+"""
+DEAL_DATE_COLUMNS = ("land_purchase_date", "mass_grading_start", "building_sale")
+DEAL_PERIOD_COLUMNS = ("rent_free_period", "lease_up_period")
+DEAL_VALUE_COLUMNS = (
+    "exit_cap",
+    "building_hard_cost",
+    "building_soft_cost",
+    "tenant_improvements",
+    "cash_contributions",
+    "land_cost",
+    "total_area",
+    "rent_per_unit_area",
+)
+DEAL_COLUMNS = DEAL_DATE_COLUMNS + DEAL_PERIOD_COLUMNS + DEAL_VALUE_COLUMNS + ("region",)
+
+"""
+Metrics of an evaluated deal, named after the QuickLookResults fields they are stored in
+"""
+RESULT_FIELDS = (
+    "unlevered_irr",
+    "unlevered_mult",
+    "yoc",
+    "ncf",
+    "unl_costs",
+    "lev_costs",
+    "unl_peak_equity",
+    "net_sale_price",
+    "gross_sale_price",
+)
+
+"""
+Deals evaluated together by evaluate_batch, bounding the size of its temporary arrays
+"""
+BATCH_CHUNK_SIZE = 2000
+
+
+def input_hash(data, version):
+    """
+    The cache key of submitted deal inputs: a SHA-256 of their canonical JSON and of
+    the version of the AssumptionTable they are evaluated with. The results only
+    depend on these, see cash_flow_timeline.
+    """
+    payload = json.dumps(
+        {"inputs": dict(data), "assumptions": version}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def month_offsets(start, dates):
+    """
+    Array counterpart of month_offset and first_month_on_or_after
+
+    Output
+    ------
+    The month offset of every date from start, and whether each date falls after the
+    first of its month (and so only counts from the following month)
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    months = days.astype("datetime64[M]")
+    offsets = (months - np.datetime64(start, "M")).astype(np.int64)
+    return offsets, days != months.astype("datetime64[D]")
+
+
+def batch_timeline(deals, horizon=CASH_FLOW_MONTHS):
+    """
+    The cash flow timeline shared by every deal of a batch: cash_flow_timeline over the
+    earliest first month and the latest last month of its deals. An empty batch starts
+    at the Unix epoch.
+
+    Output
+    ------
+    The first month as a date and the number of months
+    """
+    if not len(deals):
+        return date(1970, 1, 1), horizon
+    first = np.minimum.reduce(
+        [deals.land_purchase_date, deals.mass_grading_start, deals.building_sale]
+    )
+    start = first.min().astype("datetime64[M]").astype("datetime64[D]").item()
+    building_sale, _ = month_offsets(start, deals.building_sale)
+    mass_grading_start, _ = month_offsets(start, deals.mass_grading_start)
+    rent_start = (
+        mass_grading_start
+        + MASS_GRADING_LENGTH
+        + VERTICAL_CONSTRUCTION_LENGTH
+        + deals.rent_free_period
+        + deals.lease_up_period
+    )
+    last = max(building_sale.max(), rent_start.max() + 1)
+    return start, max(horizon, int(last) + 1)
+
+
+def column_dtype(name):
+    """
+    The numpy dtype a DealBatch stores the column in
+    """
+    if name in DEAL_DATE_COLUMNS:
+        return "datetime64[D]"
+    if name in DEAL_PERIOD_COLUMNS:
+        return np.int64
+    if name in DEAL_VALUE_COLUMNS:
+        return np.float64
+    return str
+
+
+@dataclass
+class DealBatch:
+    """
+    Many deals held as column arrays, one entry per deal
+
+    The columns take the same raw inputs as KeyDates and DealValues: dates as anything
+    numpy converts to datetime64, costs per unit area and the exit cap in percent.
+    This is the compact form of many deals: dates are held as int64 day offsets
+    (datetime64[D]) and every value as float64, about 110 bytes a deal against some
+    800 for QuicklookInputs with their KeyDates and DealValues. from_inputs and deal
+    convert between the two.
+    """
+
+    land_purchase_date: np.ndarray
+    mass_grading_start: np.ndarray
+    building_sale: np.ndarray
+    rent_free_period: np.ndarray
+    lease_up_period: np.ndarray
+    exit_cap: np.ndarray
+    building_hard_cost: np.ndarray
+    building_soft_cost: np.ndarray
+    tenant_improvements: np.ndarray
+    cash_contributions: np.ndarray
+    land_cost: np.ndarray
+    total_area: np.ndarray
+    rent_per_unit_area: np.ndarray
+    region: np.ndarray
+
+    def __post_init__(self):
+        for name in DEAL_COLUMNS:
+            setattr(self, name, np.asarray(getattr(self, name), dtype=column_dtype(name)))
+
+        lengths = {getattr(self, name).shape for name in DEAL_COLUMNS}
+        if len(lengths) != 1 or len(lengths.pop()) != 1:
+            raise ValueError("Deal columns must be one dimensional and of equal length")
+
+    def __len__(self):
+        return len(self.region)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a batch from mappings holding every column, such as serializer data
+        """
+        records = list(records)
+        return cls(**{name: [record[name] for record in records] for name in DEAL_COLUMNS})
+
+    @classmethod
+    def from_inputs(cls, inputs):
+        """
+        Build a batch from QuicklookInputs
+        """
+        return cls.from_records(
+            {**deal.key_dates.record(), **deal.values.record()} for deal in inputs
+        )
+
+    def records(self):
+        """
+        Output
+        ------
+        One dictionary of DEAL_COLUMNS per deal, with dates as datetime.date
+        """
+        columns = [getattr(self, name).tolist() for name in DEAL_COLUMNS]
+        return [dict(zip(DEAL_COLUMNS, row)) for row in zip(*columns)]
+
+    def deal(self, index, name="", assumptions=DEFAULT_ASSUMPTIONS):
+        """
+        The deal at index as QuicklookInputs
+        """
+        record = {column: getattr(self, column)[index].item() for column in DEAL_COLUMNS}
+        return QuicklookInputs.from_record({"name": name, **record}, assumptions)
 
+    @classmethod
+    def repeat(cls, record, count, **columns):
         """
-        values = self.unlevered_cash_flow()[
-            self.start_date_index() : self.end_date_index()
-        ]
+        A batch of count copies of the deal in record, except for the columns given
+        """
+        for name in DEAL_COLUMNS:
+            if name not in columns:
+                value = np.asarray(record[name], dtype=column_dtype(name))
+                columns[name] = np.full(count, value)
+        return cls(**columns)
+
+    def take(self, index):
+        """
+        The deals at index (a slice, mask or array of positions) as a new batch
+        """
+        return DealBatch(**{name: getattr(self, name)[index] for name in DEAL_COLUMNS})
+
+
+@dataclass
+class BatchResults:
+    """
+    The evaluated cash flows of a DealBatch
+
+    cash_flows is the (deals x months) unlevered cash flow over dates; every other
+    attribute holds one metric per deal, named as in RESULT_FIELDS. unlevered_irr is
+    NaN where irr_converged is False.
+    """
+
+    dates: "pd.DatetimeIndex"
+    cash_flows: np.ndarray
+    unlevered_irr: np.ndarray
+    irr_converged: np.ndarray
+    unlevered_mult: np.ndarray
+    yoc: np.ndarray
+    ncf: np.ndarray
+    unl_costs: np.ndarray
+    lev_costs: np.ndarray
+    unl_peak_equity: np.ndarray
+    net_sale_price: np.ndarray
+    gross_sale_price: np.ndarray
+
+    def __len__(self):
+        return len(self.cash_flows)
+
+    def records(self):
+        """
+        Output
+        ------
+        One dictionary of RESULT_FIELDS per deal, in batch order, with an IRR of None
+        where it did not converge
+        """
+        columns = [getattr(self, name).tolist() for name in RESULT_FIELDS]
+        records = [dict(zip(RESULT_FIELDS, row)) for row in zip(*columns)]
+        for record, converged in zip(records, self.irr_converged.tolist()):
+            if not converged:
+                record["unlevered_irr"] = None
+        return records
+
+
+def _batch_cash_flow(deals: DealBatch, market, start, months):
+    """
+    The unlevered cash flow of every deal in the batch and its per-deal totals
+
+    Line items are built for all deals at once as (deals x months) arrays and summed
+    in the same order as QuicklookInputs._build_cash_flow, month by month. market
+    holds the assumptions of every deal, see AssumptionTable.gather.
+    """
+    month = np.arange(months)
+
+    def payment(offset, amount):
+        return np.where(month == offset[:, None], amount[:, None], 0.0)
+
+    def income(first, last, amount):
+        mask = (month >= first[:, None]) & (month <= last[:, None])
+        return np.where(mask, amount[:, None], 0.0)
+
+    def budget(start, start_late, end, amount):
+        return income(start + start_late, end, -amount / (end - start + 1))
+
+    land_purchase, land_late = month_offsets(start, deals.land_purchase_date)
+    mass_grading_start, late = month_offsets(start, deals.mass_grading_start)
+    building_sale, _ = month_offsets(start, deals.building_sale)
+    mass_grading_end = mass_grading_start + MASS_GRADING_LENGTH
+    vertical_construction_end = mass_grading_end + VERTICAL_CONSTRUCTION_LENGTH
+    rent_start = (
+        vertical_construction_end + deals.rent_free_period + deals.lease_up_period
+    )
+
+    annual_rent = (
+        deals.total_area * deals.rent_per_unit_area * market["rent_periods_per_year"]
+    )
+    building_hard_cost = deals.building_hard_cost * deals.total_area
+    building_soft_cost = deals.building_soft_cost * deals.total_area
+    mass_grading = building_hard_cost * market["mass_grading_proportion"]
+    gross_sale_price = annual_rent / (deals.exit_cap / 100)
+    disposition_cost = gross_sale_price * market["disposition_pc"]
+    has_rent = (deals.total_area > 0) & (deals.rent_per_unit_area > 0)
+    net_rent = np.where(has_rent, annual_rent / 12, 0.0) * (1 - market["rental_costs"])
+
+    total_unlevered_cost = (
+        payment(land_purchase, -deals.land_cost)
+        + budget(mass_grading_start, late, mass_grading_end, mass_grading)
+        + budget(
+            mass_grading_end,
+            late,
+            vertical_construction_end,
+            building_hard_cost - mass_grading,
+        )
+        + budget(
+            mass_grading_start,
+            late,
+            vertical_construction_end,
+            (building_soft_cost + building_hard_cost) * DEVELOPMENT_FEE_PC,
+        )
+        + budget(land_purchase, land_late, mass_grading_start, building_soft_cost)
+        + budget(rent_start, late, rent_start + 1, deals.tenant_improvements * deals.total_area)
+        + budget(
+            rent_start, late, rent_start + 1, annual_rent * market["tenant_rep_commission_pc"]
+        )
+        + budget(
+            rent_start,
+            late,
+            rent_start + 1,
+            annual_rent * market["landlord_rep_commission_pc"],
+        )
+        + budget(
+            vertical_construction_end,
+            late,
+            rent_start,
+            (building_hard_cost + building_soft_cost) * EXPENSE_SLIPPAGE_PC,
+        )
+        + budget(rent_start, late, rent_start + 1, deals.cash_contributions)
+    )
+    total_revenue = (
+        payment(building_sale, gross_sale_price)
+        + payment(building_sale, -disposition_cost)
+        + income(rent_start + late, building_sale, net_rent)
+    )
+    cash_flows = total_revenue + total_unlevered_cost
+
+    sale_in_cash_flow = (building_sale >= 0) & (building_sale < months)
+    return (
+        cash_flows,
+        total_unlevered_cost.sum(axis=1),
+        np.cumsum(cash_flows, axis=1).min(axis=1),
+        np.where(sale_in_cash_flow, -disposition_cost + gross_sale_price, 0.0),
+    )
+
+
+def evaluate_batch(
+    deals: DealBatch,
+    chunk_size=BATCH_CHUNK_SIZE,
+    timeline=None,
+    horizon=CASH_FLOW_MONTHS,
+    assumptions=DEFAULT_ASSUMPTIONS,
+):
+    """
+    Evaluate every deal of the batch with array operations across the batch axis
+
+    All deals share the batch_timeline, so the cash flows form one (deals x months)
+    array. Deals are processed chunk_size at a time so that the line item temporaries
+    stay bounded whatever the batch size. Pass the (start, months) timeline of the
+    whole batch when parts of it are evaluated separately. The assumptions of every
+    deal are gathered from the AssumptionTable at once; a deal of a region missing
+    from it raises ValueError.
+
+    Output
+    ------
+    BatchResults holding the cash flows and the same metrics as QuicklookInputs
+    """
+    start, months = timeline or batch_timeline(deals, horizon)
+    market = assumptions.gather(deals.region)
+    count = len(deals)
+    cash_flows = np.empty((count, months))
+    unl_costs = np.empty(count)
+    unl_peak_equity = np.empty(count)
+    net_sale_price = np.empty(count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for begin in range(0, count, chunk_size):
+            chunk = slice(begin, begin + chunk_size)
+            (
+                cash_flows[chunk],
+                unl_costs[chunk],
+                unl_peak_equity[chunk],
+                net_sale_price[chunk],
+            ) = _batch_cash_flow(
+                deals.take(chunk),
+                {name: values[chunk] for name, values in market.items()},
+                start,
+                months,
+            )
+
+        annual_rent = (
+            deals.total_area * deals.rent_per_unit_area * market["rent_periods_per_year"]
+        )
+        levered_cost_multiple = 1 + market["debt_fees_pc"]
+        has_rent = (deals.total_area > 0) & (deals.rent_per_unit_area > 0)
+        ncf = cash_flows.sum(axis=1)
+        lev_costs = unl_costs * levered_cost_multiple
+        yoc = np.where(has_rent & (unl_costs != 0), -annual_rent / lev_costs, 0.0)
+        unlevered_mult = np.where(
+            unl_peak_equity != 0, -(ncf - unl_peak_equity) / unl_peak_equity, 0.0
+        )
+        gross_sale_price = annual_rent / (deals.exit_cap / 100)
+
+    dates = month_starts(start, months)
+    irr = xirr_batch(cash_flows, year_fractions(dates))
+
+    return BatchResults(
+        dates=dates,
+        cash_flows=cash_flows,
+        unlevered_irr=irr.rate,
+        irr_converged=irr.converged,
+        unlevered_mult=unlevered_mult,
+        yoc=yoc,
+        ncf=ncf,
+        unl_costs=unl_costs,
+        lev_costs=lev_costs,
+        unl_peak_equity=unl_peak_equity,
+        net_sale_price=net_sale_price,
+        gross_sale_price=gross_sale_price,
+    )
+
+
+"""
+Inputs that sensitivity_grid can sweep
+"""
+SENSITIVITY_PARAMETERS = ("exit_cap", "rent_per_unit_area", "building_hard_cost")
+
+
+def sensitivity_grid(record, axes, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Evaluate a deal over every combination of values of the swept inputs
+
+    Parameters
+    ----------
+    record : mapping
+        The deal, holding every DEAL_COLUMNS input
+    axes: mapping
+        The values to sweep for each input, in axis order
+
+    Output
+    ------
+    The shape of the grid and the BatchResults of its cells in row-major order, so
+    that any metric reshaped to the shape is indexed by the axes in order
+    """
+    shape = tuple(len(values) for values in axes.values())
+    columns = {
+        name: values.reshape(-1)
+        for name, values in zip(axes, np.meshgrid(*axes.values(), indexing="ij"))
+    }
+    deals = DealBatch.repeat(record, int(np.prod(shape)), **columns)
+    return shape, evaluate_batch(deals, assumptions=assumptions)
+
+
+"""
+GOAL SEEK
+
+Inputs that can be solved for and metrics that can be targeted. Without a bracket the
+solution is looked for between the input divided and multiplied by GOAL_SEEK_RANGE.
+GOAL_SEEK_DIVISORS are the inputs that are divided by, whose bracket must stay above 0.
+"""
+GOAL_SEEK_VARIABLES = ("land_cost", "rent_per_unit_area", "exit_cap", "building_hard_cost")
+GOAL_SEEK_DIVISORS = ("exit_cap",)
+GOAL_SEEK_METRICS = ("unlevered_irr", "yoc", "unlevered_em")
+GOAL_SEEK_RANGE = 10
+GOAL_SEEK_MAX_ITERATIONS = 100
+GOAL_SEEK_TOLERANCE = 1e-10
+
+
+@dataclass
+class GoalSeekSolution:
+    """
+    The input value found by goal_seek
+
+    value is the last estimate and metric its metric when converged is False.
+    """
+
+    value: float
+    metric: float
+    converged: bool
+    iterations: int
+
+
+def goal_seek(
+    record,
+    metric,
+    variable,
+    target,
+    bracket=None,
+    assumptions=DEFAULT_ASSUMPTIONS,
+    max_iterations=GOAL_SEEK_MAX_ITERATIONS,
+    tolerance=GOAL_SEEK_TOLERANCE,
+):
+    """
+    Find the value of one input of a deal at which a metric hits a target
+
+    The root is kept bracketed and approached by regula falsi, halving the weight of an
+    end that is kept twice in a row (the Illinois method) so that it does not stall.
+    Every evaluation changes the input with QuicklookInputs.update, which only
+    recomputes the line items that depend on it.
+
+    Parameters
+    ----------
+    record : mapping
+        The deal, holding every DEAL_COLUMNS input
+    metric: string
+        One of GOAL_SEEK_METRICS, the name of the QuicklookInputs metric to target
+    variable: string
+        One of GOAL_SEEK_VARIABLES, the input to solve for
+    target: float
+        The value the metric should take
+    bracket: tuple
+        The lowest and highest value of the input to look between
+    max_iterations: int
+        The number of evaluations allowed inside the bracket
+    tolerance: float
+        The largest miss on the metric, or the relative width of the bracket, that
+        counts as converged
+
+    Output
+    ------
+    GoalSeekSolution
+    """
+    if metric not in GOAL_SEEK_METRICS:
+        raise ValueError(f"Cannot seek {metric}, only {', '.join(GOAL_SEEK_METRICS)}")
+    if variable not in GOAL_SEEK_VARIABLES:
+        raise ValueError(f"Cannot solve for {variable}, only {', '.join(GOAL_SEEK_VARIABLES)}")
+
+    inputs = QuicklookInputs.from_record({"name": "", **record}, assumptions)
+    if bracket is None:
+        bracket = (record[variable] / GOAL_SEEK_RANGE, record[variable] * GOAL_SEEK_RANGE)
+
+    def miss(value):
         try:
-            return npf.irr(values) * 10
-        except:
-            return 0
+            inputs.update(**{variable: value})
+            achieved = getattr(inputs, metric)()
+        except ZeroDivisionError as error:
+            raise ValueError(f"The {metric} cannot be evaluated for a {variable} of {value}") from error
+        return None if achieved is None else float(achieved) - target
+
+    low, high = bracket
+    low_miss, high_miss = miss(low), miss(high)
+    if low_miss is None or high_miss is None or low_miss * high_miss > 0:
+        raise ValueError(
+            f"The {metric} does not reach {target} for a {variable} between {low} and {high}"
+        )
+    for value, value_miss in ((low, low_miss), (high, high_miss)):
+        if value_miss == 0:
+            return GoalSeekSolution(value, target, True, 0)
+
+    """
+    kept counts how many times in a row the high (> 0) or the low (< 0) end was kept
+    """
+    kept = 0
+    for iteration in range(1, max_iterations + 1):
+        value = (low * high_miss - high * low_miss) / (high_miss - low_miss)
+        value_miss = miss(value)
+        if value_miss is None:
+            break
+        if abs(value_miss) <= tolerance or high - low <= tolerance * max(abs(value), 1):
+            return GoalSeekSolution(value, value_miss + target, True, iteration)
+        if (value_miss < 0) == (low_miss < 0):
+            low, low_miss = value, value_miss
+            kept = max(kept, 0) + 1
+            if kept > 1:
+                high_miss /= 2
+        else:
+            high, high_miss = value, value_miss
+            kept = min(kept, 0) - 1
+            if kept < -1:
+                low_miss /= 2
+    return GoalSeekSolution(
+        value, None if value_miss is None else value_miss + target, False, iteration
+    )
+
+
+"""
+PORTFOLIOS
+
+The cash flow of a portfolio is the sum of the unlevered cash flows of its deals, month
+by month. Its metrics are those of QuicklookInputs over that sum.
+"""
+PORTFOLIO_FIELDS = ("unlevered_irr", "unlevered_mult", "ncf", "unl_peak_equity")
+
+
+def aggregate_cash_flows(starts, cash_flows):
+    """
+    Sum cash flows that run over different months
+
+    Every value is placed on its column of the combined month grid and the columns are
+    reduced with a single bincount, whatever the number of deals.
+
+    Parameters
+    ----------
+    starts : list
+        The first month of every cash flow
+    cash_flows: list
+        One array of monthly values per cash flow
+
+    Output
+    ------
+    The first month of the sum (None when there are no cash flows) and the sum
+    """
+    if not len(starts):
+        return None, np.zeros(0)
+    first = min(starts)
+    offsets = np.array([month_offset(first, start) for start in starts])
+    lengths = np.array([len(cash_flow) for cash_flow in cash_flows])
+    columns = np.arange(lengths.sum()) + np.repeat(offsets - np.cumsum(lengths) + lengths, lengths)
+    total = np.bincount(
+        columns, weights=np.concatenate(cash_flows), minlength=int((offsets + lengths).max())
+    )
+    return first, total
+
+
+def portfolio_metrics(start, cash_flow):
+    """
+    Output
+    ------
+    The IRR (None when there is none), equity multiple, net cash flow and peak equity of
+    a monthly cash flow starting at start, keyed by PORTFOLIO_FIELDS
+    """
+    if not len(cash_flow):
+        return {"unlevered_irr": None, "unlevered_mult": 0.0, "ncf": 0.0, "unl_peak_equity": 0.0}
+    ncf = float(cash_flow.sum())
+    peak_equity = float(np.cumsum(cash_flow).min())
+    solution = xirr_batch(cash_flow, year_fractions(month_start_array(start, len(cash_flow))))
+    return {
+        "unlevered_irr": float(solution.rate[0]) if solution.converged[0] else None,
+        "unlevered_mult": -(ncf - peak_equity) / peak_equity if peak_equity != 0 else 0.0,
+        "ncf": ncf,
+        "unl_peak_equity": peak_equity,
+    }
@@ -0,0 +1,212 @@
+"""
+Process-pool execution of large quicklook batches and simulations
+
+Evaluating tens of thousands of deals is CPU bound and holds the GIL of the request
+thread, so large jobs are split into chunks and spread over a ProcessPoolExecutor.
+Chunks travel to and from the workers as dictionaries of NumPy arrays, never as
+dataframes, and are merged back in chunk order so that the result does not depend on
+which worker finished first.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+
+from .ro_utils import (
+    DEAL_COLUMNS,
+    DEFAULT_ASSUMPTIONS,
+    RESULT_FIELDS,
+    BatchResults,
+    DealBatch,
+    batch_timeline,
+    evaluate_batch,
+    month_starts,
+)
+from .simulation import (
+    SIMULATION_CHUNK_SIZE,
+    SimulationResults,
+    chunk_seeds,
+    simulate_chunk,
+)
+
+RUNNER_CHUNK_SIZE = 5000
+
+"""
+BatchResults arrays sent back by the workers, one row per deal
+"""
+BATCH_ARRAYS = ("cash_flows", "irr_converged") + RESULT_FIELDS
+
+
+@dataclass
+class WorkerStats:
+    """
+    The work done by one worker process over a run
+    """
+
+    pid: int
+    chunks: int
+    items: int
+    seconds: float
+
+    @property
+    def throughput(self):
+        """
+        Items (deals or paths) evaluated per second of work
+        """
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def pool_context():
+    """
+    Start workers from a fresh server process rather than forking the (possibly
+    threaded) web worker
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _timed(function, arguments):
+    began = time.perf_counter()
+    result = function(*arguments)
+    return os.getpid(), time.perf_counter() - began, result
+
+
+def map_chunks(function, chunks, sizes, workers=None, progress=None):
+    """
+    Call function on every chunk of arguments, in worker processes when workers > 1
+
+    Parameters
+    ----------
+    function : callable
+        A module-level function, so that it can be sent to the workers
+    chunks: list
+        The argument tuple of each call
+    sizes: list
+        The number of items in each chunk, for the throughput report
+    workers: int
+        The number of processes, all cores when None
+    progress: callable
+        Called with the fraction of items done each time a chunk completes
+
+    Output
+    ------
+    The results in chunk order, and a WorkerStats for each process that did work
+    """
+    total = sum(sizes)
+    done = 0
+
+    def report(size):
+        nonlocal done
+        done += size
+        if progress is not None:
+            progress(done / total)
+
+    workers = min(workers or default_workers(), len(chunks))
+    if workers <= 1:
+        outcomes = []
+        for arguments, size in zip(chunks, sizes):
+            outcomes.append(_timed(function, arguments))
+            report(size)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+            futures = {
+                pool.submit(_timed, function, arguments): size
+                for arguments, size in zip(chunks, sizes)
+            }
+            for future in as_completed(futures):
+                report(futures[future])
+            outcomes = [future.result() for future in futures]
+
+    stats = {}
+    for (pid, seconds, _), size in zip(outcomes, sizes):
+        worker = stats.setdefault(pid, WorkerStats(pid=pid, chunks=0, items=0, seconds=0.0))
+        worker.chunks += 1
+        worker.items += size
+        worker.seconds += seconds
+    return [result for _, _, result in outcomes], sorted(stats.values(), key=lambda w: w.pid)
+
+
+def evaluate_columns(columns, timeline, assumptions):
+    """
+    Worker side of run_batch: evaluate one chunk of deal columns over the batch timeline
+    """
+    results = evaluate_batch(DealBatch(**columns), timeline=timeline, assumptions=assumptions)
+    return {name: getattr(results, name) for name in BATCH_ARRAYS}
+
+
+def run_batch(
+    deals: DealBatch,
+    workers=None,
+    chunk_size=RUNNER_CHUNK_SIZE,
+    progress=None,
+    assumptions=DEFAULT_ASSUMPTIONS,
+):
+    """
+    evaluate_batch split over worker processes
+
+    Output
+    ------
+    The BatchResults of the whole batch, in batch order, and the WorkerStats
+    """
+    timeline = batch_timeline(deals)
+    if not len(deals):
+        return evaluate_batch(deals, timeline=timeline, assumptions=assumptions), []
+
+    bounds = range(0, len(deals), chunk_size)
+    chunks = [
+        (
+            {name: getattr(deals, name)[begin : begin + chunk_size] for name in DEAL_COLUMNS},
+            timeline,
+            assumptions,
+        )
+        for begin in bounds
+    ]
+    sizes = [min(chunk_size, len(deals) - begin) for begin in bounds]
+    parts, stats = map_chunks(evaluate_columns, chunks, sizes, workers, progress)
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in BATCH_ARRAYS}
+    return BatchResults(dates=month_starts(*timeline), **merged), stats
+
+
+def run_simulation(
+    record,
+    distributions,
+    paths,
+    seed=None,
+    workers=None,
+    chunk_size=SIMULATION_CHUNK_SIZE,
+    progress=None,
+    assumptions=DEFAULT_ASSUMPTIONS,
+):
+    """
+    simulate split over worker processes
+
+    The chunks and their seeds are those of simulate, so both give the same paths
+    for the same seed and chunk size.
+
+    Output
+    ------
+    The SimulationResults and the WorkerStats
+    """
+    entropy, seeds = chunk_seeds(paths, seed, chunk_size)
+    chunks = [
+        (record, distributions, chunk_seed, size, assumptions) for chunk_seed, size in seeds
+    ]
+    parts, stats = map_chunks(
+        simulate_chunk, chunks, [size for _, size in seeds], workers, progress
+    )
+    return (
+        SimulationResults(
+            seed=entropy,
+            unlevered_irr=np.concatenate([irr for irr, _ in parts]),
+            unl_peak_equity=np.concatenate([peak for _, peak in parts]),
+        ),
+        stats,
+    )
@@ -1,5 +1,18 @@
+from math import prod
+
 from rest_framework import serializers, fields
-from .models import QuickLookResults, QuickLookQuery
+from .assumptions import load_assumptions
+from .models import Portfolio, QuickLookJob, QuickLookResults, QuickLookQuery
+from .export import EXPORT_FORMATS
+from .portfolios import unpack
+from .ro_utils import (
+    GOAL_SEEK_DIVISORS,
+    GOAL_SEEK_METRICS,
+    GOAL_SEEK_VARIABLES,
+    PORTFOLIO_FIELDS,
+    SENSITIVITY_PARAMETERS,
+)
+from .simulation import DISTRIBUTIONS, SIMULATION_PARAMETERS, Distribution
 
 
 class QuickLookQuerySerializer(serializers.ModelSerializer):
@@ -29,12 +42,50 @@ class QuickLookQuerySerializer(serializers.ModelSerializer):
             "lease_up_period",
         )
 
+    def validate_exit_cap(self, value):
+        """
+        The exit cap divides the rent into the sale price
+        """
+        if value <= 0:
+            raise serializers.ValidationError("Ensure this value is greater than 0.")
+        return value
+
+    def validate_region(self, value):
+        """
+        Regions are those of the AssumptionTable in the "assumptions" context, or of the
+        active one, loaded once for the whole serializer
+        """
+        if "assumptions" not in self.context:
+            self.context["assumptions"] = load_assumptions()
+        if value not in self.context["assumptions"]:
+            raise serializers.ValidationError(f"There are no assumptions for {value}.")
+        return value
+
+
+"""
+Rows accepted by one bulk submission
+"""
+MAX_BULK_ROWS = 10000
+
+
+class BulkSerializer(serializers.ListSerializer):
+    """
+    The JSON array of queries taken by bulk_analysis, as a job payload
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("child", QuickLookQuerySerializer())
+        kwargs.setdefault("max_length", MAX_BULK_ROWS)
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(*args, **kwargs)
+
 
 class QuickLookResultsSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuickLookResults
         fields = (    
             "pk",       
+            "query",
             "unlevered_irr",
             "unlevered_mult",
             "yoc",
@@ -45,3 +96,177 @@ class QuickLookResultsSerializer(serializers.ModelSerializer):
             "gross_sale_price",
             "net_sale_price",
         )
+
+
+class PortfolioSerializer(serializers.ModelSerializer):
+    queries = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=QuickLookQuery.objects.all()
+    )
+    cash_flow = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Portfolio
+        fields = ("pk", "name", "created", "queries", "cash_flow_start", "cash_flow")
+        fields += PORTFOLIO_FIELDS
+        read_only_fields = ("created", "cash_flow_start") + PORTFOLIO_FIELDS
+
+    def get_cash_flow(self, portfolio):
+        """
+        The summed unlevered cash flow, one value per month from cash_flow_start
+        """
+        if portfolio.cash_flow is None:
+            return None
+        return unpack(portfolio.cash_flow).tolist()
+
+
+class QuickLookQueryFilterSerializer(serializers.Serializer):
+    region = serializers.CharField(required=False)
+    date_after = serializers.DateField(input_formats=["%Y-%m-%d"], required=False)
+    date_before = serializers.DateField(input_formats=["%Y-%m-%d"], required=False)
+    stream = serializers.BooleanField(default=False)
+
+
+class CashFlowExportSerializer(QuickLookQueryFilterSerializer):
+    output = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default="csv")
+
+
+class SensitivityRangeSerializer(serializers.Serializer):
+    start = serializers.FloatField()
+    stop = serializers.FloatField()
+    num = serializers.IntegerField(min_value=1, max_value=100)
+
+
+class SensitivitySerializer(serializers.Serializer):
+    MAX_CELLS = 50 * 50 * 50
+
+    query = QuickLookQuerySerializer()
+    ranges = serializers.DictField(
+        child=SensitivityRangeSerializer(), allow_empty=False
+    )
+
+    def validate_ranges(self, value):
+        unknown = set(value) - set(SENSITIVITY_PARAMETERS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Only {', '.join(SENSITIVITY_PARAMETERS)} can be varied, not "
+                f"{', '.join(sorted(unknown))}"
+            )
+        if prod(axis["num"] for axis in value.values()) > self.MAX_CELLS:
+            raise serializers.ValidationError(
+                f"The grid can hold at most {self.MAX_CELLS} cells"
+            )
+        return value
+
+
+class GoalSeekSerializer(serializers.Serializer):
+    query = QuickLookQuerySerializer()
+    metric = serializers.ChoiceField(choices=GOAL_SEEK_METRICS)
+    variable = serializers.ChoiceField(choices=GOAL_SEEK_VARIABLES)
+    target = serializers.FloatField()
+    low = serializers.FloatField(required=False, min_value=0)
+    high = serializers.FloatField(required=False, min_value=0)
+
+    def validate(self, data):
+        if ("low" in data) != ("high" in data):
+            raise serializers.ValidationError("Give both low and high, or neither")
+        if "low" in data and data["low"] >= data["high"]:
+            raise serializers.ValidationError("low must be below high")
+        if "low" in data and data["variable"] in GOAL_SEEK_DIVISORS and data["low"] <= 0:
+            raise serializers.ValidationError(f"low must be above 0 for {data['variable']}")
+        return data
+
+
+class DistributionSerializer(serializers.Serializer):
+    distribution = serializers.ChoiceField(choices=list(DISTRIBUTIONS))
+    low = serializers.FloatField(required=False)
+    high = serializers.FloatField(required=False)
+    mean = serializers.FloatField(required=False)
+    std = serializers.FloatField(required=False, min_value=0)
+    left = serializers.FloatField(required=False)
+    mode = serializers.FloatField(required=False)
+    right = serializers.FloatField(required=False)
+
+    def validate(self, data):
+        names = DISTRIBUTIONS[data["distribution"]]
+        missing = [name for name in names if name not in data]
+        if missing:
+            raise serializers.ValidationError(
+                f"A {data['distribution']} distribution needs {', '.join(missing)}"
+            )
+        if data["distribution"] == "uniform" and data["low"] > data["high"]:
+            raise serializers.ValidationError("low must not be above high")
+        if data["distribution"] == "triangular" and not (
+            data["left"] <= data["mode"] <= data["right"] and data["left"] < data["right"]
+        ):
+            raise serializers.ValidationError(
+                "left, mode and right must be in order, with left below right"
+            )
+        return Distribution(data["distribution"], tuple(data[name] for name in names))
+
+
+class SimulationSerializer(serializers.Serializer):
+    query = QuickLookQuerySerializer()
+    distributions = serializers.DictField(
+        child=DistributionSerializer(), allow_empty=False
+    )
+    paths = serializers.IntegerField(min_value=1, max_value=1000000, default=100000)
+    seed = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_distributions(self, value):
+        unknown = set(value) - set(SIMULATION_PARAMETERS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Only {', '.join(SIMULATION_PARAMETERS)} can be simulated, not "
+                f"{', '.join(sorted(unknown))}"
+            )
+        if "exit_cap" in value and value["exit_cap"].lowest() <= 0:
+            raise serializers.ValidationError("The exit_cap distribution must stay above 0")
+        return value
+
+
+
+class QuickLookJobSerializer(serializers.ModelSerializer):
+    """
+    A job is submitted with its kind and the request body of the matching endpoint,
+    which is validated up front so that a queued job only fails on errors of its run
+    """
+
+    ANALYSES = {
+        QuickLookJob.SENSITIVITY: SensitivitySerializer,
+        QuickLookJob.SIMULATION: SimulationSerializer,
+        QuickLookJob.BULK: BulkSerializer,
+    }
+
+    payload = serializers.JSONField(write_only=True)
+
+    class Meta:
+        model = QuickLookJob
+        fields = (
+            "pk",
+            "kind",
+            "payload",
+            "status",
+            "progress",
+            "result",
+            "error",
+            "created",
+            "started",
+            "heartbeat",
+            "finished",
+        )
+        read_only_fields = (
+            "status",
+            "progress",
+            "result",
+            "error",
+            "created",
+            "started",
+            "heartbeat",
+            "finished",
+        )
+
+    def validate(self, data):
+        analysis = self.ANALYSES[data["kind"]](data=data["payload"])
+        if not analysis.is_valid():
+            raise serializers.ValidationError({"payload": analysis.errors})
+        return data
@@ -0,0 +1,206 @@
+"""
+Monte Carlo risk simulation of a quicklook deal
+
+Uncertain inputs are drawn from user-specified distributions and every path is
+evaluated with the batch engine of ro_utils. Paths are streamed in fixed-size chunks,
+each with its own generator spawned from one seed, so only one chunk of cash flows is
+held at a time and the results are reproducible for a given seed and chunk size.
+Chunks are independent of each other and can be evaluated in any order or process.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .ro_utils import DEFAULT_ASSUMPTIONS, DealBatch, evaluate_batch
+
+"""
+Inputs that can be given a distribution
+"""
+SIMULATION_PARAMETERS = (
+    "exit_cap",
+    "rent_per_unit_area",
+    "building_hard_cost",
+    "lease_up_period",
+)
+
+"""
+Distributions and the parameters they take, in the order numpy expects them
+"""
+DISTRIBUTIONS = {
+    "uniform": ("low", "high"),
+    "normal": ("mean", "std"),
+    "triangular": ("left", "mode", "right"),
+}
+
+"""
+The lowest value drawn for an input. exit_cap divides the rent, so it is kept above 0
+even in the tails of a normal distribution.
+"""
+SIMULATION_FLOORS = {"exit_cap": 0.01}
+
+"""
+Standard deviations below the mean at which a normal distribution counts as reaching
+its lowest value, when checking that it keeps exit_cap above 0
+"""
+SIMULATION_NORMAL_SIGMAS = 4
+
+SIMULATION_CHUNK_SIZE = 10000
+SIMULATION_PERCENTILES = (5, 25, 50, 75, 95)
+SIMULATION_BINS = 50
+
+
+@dataclass
+class Distribution:
+    """
+    A distribution to draw one input from
+
+    Parameters
+    ----------
+    kind : string
+        One of the DISTRIBUTIONS
+    parameters: tuple
+        The parameters of the distribution, in the order listed in DISTRIBUTIONS
+    """
+
+    kind: str
+    parameters: tuple
+
+    def lowest(self):
+        """
+        The lowest value the distribution reaches, taking a normal distribution to end
+        SIMULATION_NORMAL_SIGMAS below its mean
+        """
+        if self.kind == "normal":
+            mean, std = self.parameters
+            return mean - SIMULATION_NORMAL_SIGMAS * std
+        return self.parameters[0]
+
+    def sample(self, generator, size, floor=0):
+        """
+        Draw size values, floored at floor since no swept input can be negative
+        """
+        return np.maximum(getattr(generator, self.kind)(*self.parameters, size), floor)
+
+
+@dataclass
+class SimulationResults:
+    """
+    The per-path IRR and peak equity of a simulation
+
+    unlevered_irr is NaN on the paths where the IRR did not converge.
+    """
+
+    seed: int
+    unlevered_irr: np.ndarray
+    unl_peak_equity: np.ndarray
+
+    def __len__(self):
+        return len(self.unlevered_irr)
+
+    def summary(self, percentiles=SIMULATION_PERCENTILES, bins=SIMULATION_BINS):
+        """
+        Output
+        ------
+        Percentiles and a histogram of each metric, IRR over the converged paths only
+        """
+        irr = self.unlevered_irr[np.isfinite(self.unlevered_irr)]
+        return {
+            "paths": len(self),
+            "seed": self.seed,
+            "irr_converged": len(irr),
+            "unlevered_irr": describe(irr, percentiles, bins),
+            "unl_peak_equity": describe(self.unl_peak_equity, percentiles, bins),
+        }
+
+
+def describe(values, percentiles, bins):
+    """
+    Percentiles and a histogram of the finite values, for the JSON response
+    """
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {"percentiles": {}, "histogram": {"counts": [], "edges": []}}
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "percentiles": dict(zip(percentiles, np.percentile(values, percentiles).tolist())),
+        "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+    }
+
+
+def simulate_chunk(record, distributions, seed, size, assumptions=DEFAULT_ASSUMPTIONS):
+    """
+    Evaluate one chunk of paths
+
+    Parameters
+    ----------
+    record : mapping
+        The deal, holding every DEAL_COLUMNS input
+    distributions: mapping
+        A Distribution for each input to draw
+    seed: SeedSequence
+        The seed of this chunk's generator
+    size: int
+        The number of paths in the chunk
+    assumptions: AssumptionTable
+        The region assumptions to evaluate the paths with
+
+    Output
+    ------
+    The IRR (NaN where it did not converge) and peak equity of every path
+    """
+    generator = np.random.default_rng(seed)
+    columns = {
+        name: distribution.sample(generator, size, SIMULATION_FLOORS.get(name, 0))
+        for name, distribution in distributions.items()
+    }
+    if "lease_up_period" in columns:
+        columns["lease_up_period"] = np.rint(columns["lease_up_period"])
+
+    results = evaluate_batch(
+        DealBatch.repeat(record, size, **columns), assumptions=assumptions
+    )
+    return results.unlevered_irr, results.unl_peak_equity
+
+
+def chunk_seeds(paths, seed=None, chunk_size=SIMULATION_CHUNK_SIZE):
+    """
+    Split the paths into chunks, each with a seed spawned from seed
+
+    Output
+    ------
+    The root seed (drawn from the OS when seed is None, so that it can be reported
+    and replayed) and a list of (seed, size) pairs, one per chunk
+    """
+    root = np.random.SeedSequence(seed)
+    sizes = [min(chunk_size, paths - begin) for begin in range(0, paths, chunk_size)]
+    return root.entropy, list(zip(root.spawn(len(sizes)), sizes))
+
+
+def simulate(
+    record,
+    distributions,
+    paths,
+    seed=None,
+    chunk_size=SIMULATION_CHUNK_SIZE,
+    assumptions=DEFAULT_ASSUMPTIONS,
+):
+    """
+    Run a Monte Carlo simulation of a deal over paths draws of its uncertain inputs
+
+    Output
+    ------
+    SimulationResults holding the IRR and peak equity of every path
+    """
+    entropy, chunks = chunk_seeds(paths, seed, chunk_size)
+    unlevered_irr = np.empty(paths)
+    unl_peak_equity = np.empty(paths)
+    begin = 0
+    for chunk_seed, size in chunks:
+        chunk = slice(begin, begin + size)
+        unlevered_irr[chunk], unl_peak_equity[chunk] = simulate_chunk(
+            record, distributions, chunk_seed, size, assumptions
+        )
+        begin += size
+    return SimulationResults(
+        seed=entropy, unlevered_irr=unlevered_irr, unl_peak_equity=unl_peak_equity
+    )
@@ -1,3 +1,892 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import subprocess
+import sys
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from .ro_utils import (
+    CASH_FLOW_MONTHS,
+    DEFAULT_ASSUMPTIONS,
+    AssumptionTable,
+    DealBatch,
+    DealValues,
+    KeyDates,
+    QuicklookInputs,
+    RegionAssumptions,
+    aggregate_cash_flows,
+    evaluate_batch,
+    goal_seek,
+    irr_batch,
+    month_offset,
+    portfolio_metrics,
+    xirr_batch,
+    year_fractions,
+)
+from .admin import RegionAssumptionInline
+from .benchmarks import format_report, measure, sample_batch
+from .export import export_available, pyarrow_importable
+from .jobs import ANALYSES, claim_job, run_job
+from .models import AssumptionSet, Portfolio, QuickLookJob, QuickLookQuery, QuickLookResults
+from . import portfolios
+from .runner import run_batch, run_simulation
+from .simulation import Distribution, SimulationResults, simulate
+
+
+KEY_DATES = dict(
+    land_purchase_date=datetime.datetime(2024, 1, 1),
+    mass_grading_start=datetime.datetime(2024, 6, 1),
+    building_sale=datetime.datetime(2027, 6, 1),
+    rent_free_period=3,
+    lease_up_period=6,
+)
+
+DEAL_VALUES = dict(
+    exit_cap=5.5,
+    building_hard_cost=80,
+    building_soft_cost=15,
+    tenant_improvements=10,
+    cash_contributions=50000,
+    land_cost=2000000,
+    total_area=100000,
+    rent_per_unit_area=8,
+    region="UK",
+)
+
+
+def create_key_dates(**kwargs):
+    return KeyDates(**{**KEY_DATES, **kwargs})
+
+
+def create_deal_values(**kwargs):
+    return DealValues(**{**DEAL_VALUES, **kwargs})
+
+
+def create_inputs(horizon=CASH_FLOW_MONTHS, **kwargs):
+    return QuicklookInputs(
+        name="Test Deal",
+        key_dates=create_key_dates(**{k: v for k, v in kwargs.items() if k in KEY_DATES}),
+        values=create_deal_values(**{k: v for k, v in kwargs.items() if k in DEAL_VALUES}),
+        horizon=horizon,
+    )
+
+
+def create_record(**kwargs):
+    return {**KEY_DATES, **DEAL_VALUES, **kwargs}
+
+
+def create_query_data(**kwargs):
+    data = {"name": "Test Deal", **create_record(**kwargs)}
+    for name in ("land_purchase_date", "mass_grading_start", "building_sale"):
+        data[name] = f"{data[name]:%Y-%m-%d}"
+    return data
+
+
+class QuicklookInputsTestCase(SimpleTestCase):
+    def test_cash_flow_is_built_once(self):
+        inputs = create_inputs()
+        cash_flow = inputs.cash_flow()
+        inputs.unlevered_em()
+        inputs.net_sale_price()
+        self.assertIs(inputs.cash_flow(), cash_flow)
+
+    def test_cash_flow_rebuilt_when_inputs_change(self):
+        inputs = create_inputs()
+        net_sale_price = inputs.net_sale_price()
+        inputs.values = create_deal_values(exit_cap=6.5)
+        self.assertLess(inputs.net_sale_price(), net_sale_price)
+
+        inputs.values.gross_sale_price = 0
+        inputs.values.disposition_cost = 0
+        inputs.invalidate_cash_flow()
+        self.assertEqual(inputs.net_sale_price(), 0)
+
+    def test_cash_flow_runs_over_the_deal_timeline(self):
+        inputs = create_inputs(building_sale=datetime.datetime(2040, 3, 1))
+        dates = inputs.cash_flow().dates()
+        self.assertEqual(dates[0], pd.Timestamp(2024, 1, 1))
+        self.assertEqual(dates[-1], pd.Timestamp(2040, 3, 1))
+        self.assertGreater(inputs.net_sale_price(), 0)
+
+        self.assertEqual(len(create_inputs().cash_flow()), CASH_FLOW_MONTHS)
+        self.assertEqual(len(create_inputs(horizon=12).cash_flow()), 42)
+
+    def test_incremental_update_matches_full_rebuild(self):
+        for changes, line_items in (
+            ({"exit_cap": 6.5}, {"Building Sale", "Disposition Cost"}),
+            ({"land_cost": 1500000}, {"Land Purchase"}),
+            ({"region": "Poland"}, None),
+            ({"lease_up_period": 9, "cash_contributions": 0}, None),
+            ({"building_sale": datetime.datetime(2040, 3, 1)}, None),
+        ):
+            inputs = create_inputs()
+            inputs.results()
+            recomputed = inputs.update(**changes)
+            if line_items is not None:
+                self.assertEqual(set(recomputed), line_items)
+            rebuilt = create_inputs(**changes)
+            np.testing.assert_array_equal(inputs.cash_flow().data, rebuilt.cash_flow().data)
+            self.assertEqual(inputs.results(), rebuilt.results())
+
+        with self.assertRaises(TypeError):
+            create_inputs().update(exit=6)
+
+    def test_engine_import_and_results_do_not_load_pandas(self):
+        script = (
+            "import sys; from quicklook.benchmarks import sample_inputs; "
+            "sample_inputs().results(); print('pandas' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(output.stdout.strip(), "False")
+
+    def test_array_engine_matches_pandas_reference(self):
+        for inputs in (
+            create_inputs(),
+            create_inputs(region="Poland", exit_cap=7),
+            create_inputs(
+                land_purchase_date=datetime.datetime(2019, 3, 1),
+                mass_grading_start=datetime.datetime(2019, 9, 15),
+                building_sale=datetime.datetime(2035, 1, 1),
+            ),
+        ):
+            pd.testing.assert_frame_equal(
+                inputs.uses_cash_flow(), inputs.uses_cash_flow_pandas(), check_exact=True
+            )
+
+
+class DealBatchTestCase(SimpleTestCase):
+    def test_batch_matches_single_deals(self):
+        variants = [
+            {},
+            {"region": "Poland", "exit_cap": 7},
+            {"region": "US", "rent_per_unit_area": 0},
+            {"mass_grading_start": datetime.datetime(2024, 6, 15), "lease_up_period": 0},
+            {"building_sale": datetime.datetime(2035, 1, 1)},
+        ]
+        results = evaluate_batch(
+            DealBatch.from_records(create_record(**variant) for variant in variants),
+            chunk_size=2,
+        )
+        self.assertEqual(results.cash_flows.shape, (len(variants), len(results.dates)))
+
+        for deal, variant in enumerate(variants):
+            inputs = create_inputs(**variant)
+            cash_flow = inputs.cash_flow()["Unlevered Cash Flow"]
+            first = month_offset(results.dates[0], inputs.cash_flow_start())
+            row = results.cash_flows[deal]
+            np.testing.assert_array_equal(row[first : first + len(cash_flow)], cash_flow)
+            self.assertEqual(np.count_nonzero(row), np.count_nonzero(cash_flow))
+            record = results.records()[deal]
+            self.assertEqual(record["ncf"], inputs.unlevered_ncf())
+            self.assertEqual(record["unl_peak_equity"], inputs.unlevered_peak_equity())
+            self.assertEqual(record["unlevered_mult"], inputs.unlevered_em())
+            self.assertEqual(record["yoc"], inputs.yoc())
+            self.assertEqual(record["lev_costs"], inputs.total_levered_cost())
+            self.assertEqual(record["net_sale_price"], inputs.net_sale_price())
+            self.assertAlmostEqual(record["unlevered_irr"], inputs.unlevered_irr())
+
+    def test_conversion_to_and_from_inputs(self):
+        variants = [{}, {"region": "Poland", "exit_cap": 7, "lease_up_period": 2}]
+        inputs = [create_inputs(**variant) for variant in variants]
+        deals = DealBatch.from_inputs(inputs)
+        expected = DealBatch.from_records(create_record(**variant) for variant in variants)
+        self.assertEqual(deals.records(), expected.records())
+
+        deal = deals.deal(1, name="Test Deal")
+        self.assertFalse(hasattr(deal.values, "__dict__"))
+        self.assertEqual(deal.values.record(), inputs[1].values.record())
+        self.assertEqual(deal.unlevered_ncf(), inputs[1].unlevered_ncf())
+
+    def test_columns_must_have_equal_length(self):
+        columns = {name: [value] for name, value in create_record().items()}
+        columns["region"] = ["UK", "US"]
+        with self.assertRaises(ValueError):
+            DealBatch(**columns)
+
+
+class AssumptionTableTestCase(SimpleTestCase):
+    assumptions = AssumptionTable(
+        version=1,
+        assumptions={
+            "UK": DEFAULT_ASSUMPTIONS["UK"],
+            "Spain": RegionAssumptions(
+                rent_periods_per_year=12,
+                debt_fees_pc=0.05,
+                disposition_pc=0.04,
+                rental_costs=0.2,
+            ),
+        },
+    )
+
+    def test_new_market_in_single_and_batch_evaluation(self):
+        inputs = QuicklookInputs.from_record(
+            {"name": "Test Deal", **create_record(region="Spain")}, self.assumptions
+        )
+        self.assertEqual(inputs.values.annual_rent, 12 * 8 * 100000)
+
+        results = evaluate_batch(
+            DealBatch.from_records([create_record(region="Spain"), create_record()]),
+            assumptions=self.assumptions,
+        )
+        self.assertEqual(results.records()[0]["ncf"], inputs.unlevered_ncf())
+        self.assertEqual(results.records()[0]["lev_costs"], inputs.total_levered_cost())
+        self.assertEqual(results.records()[1]["ncf"], create_inputs().unlevered_ncf())
+
+    def test_unknown_regions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            create_deal_values(region="Atlantis")
+        with self.assertRaisesMessage(ValueError, "'Atlantis'"):
+            evaluate_batch(DealBatch.from_records([create_record(region="Atlantis")]))
+        with self.assertRaises(ValueError):
+            self.assumptions.gather(["UK", "Poland"])
+
+
+class GoalSeekTestCase(SimpleTestCase):
+    def test_solution_hits_the_target(self):
+        for metric, variable, target in (
+            ("unlevered_irr", "land_cost", 0.05),
+            ("yoc", "land_cost", 0.06),
+            ("unlevered_irr", "exit_cap", 0.12),
+        ):
+            solution = goal_seek(create_record(), metric, variable, target)
+            self.assertTrue(solution.converged)
+            self.assertLess(solution.iterations, 20)
+            inputs = create_inputs(**{variable: solution.value})
+            self.assertAlmostEqual(getattr(inputs, metric)(), target, places=9)
+
+    def test_unreachable_target(self):
+        with self.assertRaises(ValueError):
+            goal_seek(create_record(), "unlevered_irr", "land_cost", 0.5)
+        with self.assertRaises(ValueError):
+            goal_seek(create_record(), "ncf", "land_cost", 0)
+        with self.assertRaises(ValueError):
+            goal_seek(create_record(), "unlevered_irr", "exit_cap", 0.1, bracket=(0, 10))
+
+
+class PortfolioAggregationTestCase(SimpleTestCase):
+    def test_cash_flows_are_summed_by_month(self):
+        start, total = aggregate_cash_flows(
+            [datetime.date(2024, 3, 1), datetime.date(2024, 1, 1)],
+            [np.array([1.0, 2.0]), np.array([10.0, 20.0, 30.0, 40.0, 50.0])],
+        )
+        self.assertEqual(start, datetime.date(2024, 1, 1))
+        np.testing.assert_array_equal(total, [10, 20, 31, 42, 50])
+        self.assertEqual(len(aggregate_cash_flows([], [])[1]), 0)
+
+    def test_metrics_of_one_deal(self):
+        inputs = create_inputs()
+        cash_flow = inputs.cash_flow()
+        metrics = portfolio_metrics(cash_flow.start, cash_flow["Unlevered Cash Flow"])
+        self.assertAlmostEqual(metrics["unlevered_irr"], inputs.unlevered_irr())
+        self.assertAlmostEqual(metrics["unlevered_mult"], inputs.unlevered_em())
+        self.assertAlmostEqual(metrics["unl_peak_equity"], inputs.unlevered_peak_equity())
+
+
+class IRRSolverTestCase(SimpleTestCase):
+    def test_known_rates(self):
+        solution = xirr_batch(
+            [[-100, 110, 0], [-100, 0, 121], [-100, 50, 60]], [0, 1, 2]
+        )
+        self.assertTrue(solution.converged.all())
+        np.testing.assert_allclose(solution.rate[:2], [0.1, 0.1])
+        self.assertAlmostEqual(solution.rate[2], 0.0639410298)
+
+    def test_cash_flow_without_sign_change_does_not_converge(self):
+        solution = irr_batch([[-100, -10, -5], [0, 0, 0], [-100, 150, 0]])
+        np.testing.assert_array_equal(solution.converged, [False, False, True])
+        self.assertTrue(np.isnan(solution.rate[:2]).all())
+        self.assertEqual(create_inputs(rent_per_unit_area=0).unlevered_irr(), None)
+
+    def test_deal_irr_discounts_cash_flow_to_zero(self):
+        inputs = create_inputs()
+        cash_flow = inputs.cash_flow()
+        times = year_fractions(cash_flow.dates())
+        npv = (cash_flow["Unlevered Cash Flow"] / (1 + inputs.unlevered_irr()) ** times).sum()
+        self.assertAlmostEqual(npv / inputs.values.land_cost, 0)
+
+
+class SimulationTestCase(SimpleTestCase):
+    distributions = {
+        "exit_cap": Distribution("normal", (5.5, 0.5)),
+        "rent_per_unit_area": Distribution("triangular", (6, 8, 11)),
+        "lease_up_period": Distribution("uniform", (0, 12)),
+    }
+
+    def test_simulation_is_reproducible(self):
+        first = simulate(create_record(), self.distributions, paths=500, seed=7, chunk_size=200)
+        second = simulate(create_record(), self.distributions, paths=500, seed=7, chunk_size=200)
+        np.testing.assert_array_equal(first.unlevered_irr, second.unlevered_irr)
+        np.testing.assert_array_equal(first.unl_peak_equity, second.unl_peak_equity)
+
+        other = simulate(create_record(), self.distributions, paths=500, seed=8, chunk_size=200)
+        self.assertFalse(np.array_equal(first.unlevered_irr, other.unlevered_irr))
+
+    def test_summary(self):
+        summary = simulate(create_record(), self.distributions, paths=1000, seed=7).summary()
+        self.assertEqual(summary["paths"], 1000)
+        self.assertEqual(summary["seed"], 7)
+        irr = summary["unlevered_irr"]
+        self.assertEqual(sum(irr["histogram"]["counts"]), summary["irr_converged"])
+        self.assertLess(irr["percentiles"][5], irr["percentiles"][50])
+        self.assertLess(irr["percentiles"][50], irr["percentiles"][95])
+        self.assertAlmostEqual(
+            irr["percentiles"][50], create_inputs().unlevered_irr(), delta=0.02
+        )
+
+    def test_summary_skips_non_finite_values(self):
+        results = SimulationResults(
+            seed=0,
+            unlevered_irr=np.array([0.1, np.nan, 0.2]),
+            unl_peak_equity=np.array([1.0, np.nan, np.inf, 2.0]),
+        )
+        summary = results.summary(percentiles=(50,), bins=2)
+        self.assertEqual(summary["unl_peak_equity"]["histogram"]["counts"], [1, 1])
+        self.assertEqual(summary["unl_peak_equity"]["percentiles"], {50: 1.5})
+
+    def test_exit_cap_draws_stay_above_zero(self):
+        values = Distribution("normal", (0.5, 1)).sample(np.random.default_rng(0), 1000, 0.01)
+        self.assertEqual(values.min(), 0.01)
+
+
+
+class RunnerTestCase(SimpleTestCase):
+    def test_pool_results_match_in_process_evaluation(self):
+        deals = DealBatch.from_records(
+            create_record(exit_cap=exit_cap) for exit_cap in np.linspace(4, 8, 25)
+        )
+        results, workers = run_batch(deals, workers=2, chunk_size=10)
+        expected = evaluate_batch(deals)
+        np.testing.assert_array_equal(results.cash_flows, expected.cash_flows)
+        np.testing.assert_array_equal(results.unlevered_irr, expected.unlevered_irr)
+        self.assertEqual(sum(worker.chunks for worker in workers), 3)
+        self.assertEqual(sum(worker.items for worker in workers), 25)
+
+        distributions = {"exit_cap": Distribution("normal", (5.5, 0.5))}
+        simulated, _ = run_simulation(
+            create_record(), distributions, paths=300, seed=1, workers=2, chunk_size=100
+        )
+        expected = simulate(create_record(), distributions, paths=300, seed=1, chunk_size=100)
+        np.testing.assert_array_equal(simulated.unlevered_irr, expected.unlevered_irr)
+
+
+class BenchmarkTestCase(SimpleTestCase):
+    def test_measure(self):
+        deals = sample_batch(10)
+        benchmark = measure("evaluate_batch[10]", lambda: evaluate_batch(deals), size=10)
+        self.assertGreaterEqual(len(benchmark.seconds), 5)
+        self.assertGreater(benchmark.peak_memory, deals.cash_contributions.nbytes)
+        self.assertAlmostEqual(benchmark.throughput * np.median(benchmark.seconds), 10)
+        self.assertEqual(list(benchmark.percentiles()), [50, 95, 99])
+        self.assertIn("evaluate_batch[10]", format_report([benchmark]))
+
+
+class QuicklookRoutesTestCase(TestCase):
+    def test_sensitivity_grid(self):
+        response = self.client.post(
+            reverse("sensitivity_analysis"),
+            {
+                "query": create_query_data(),
+                "ranges": {
+                    "exit_cap": {"start": 4, "stop": 7, "num": 4},
+                    "rent_per_unit_area": {"start": 6, "stop": 10, "num": 3},
+                },
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["axes"]["exit_cap"], [4, 5, 6, 7])
+        self.assertEqual(len(data["unlevered_irr"]), 4)
+        self.assertEqual(len(data["unlevered_irr"][0]), 3)
+
+        cell = create_inputs(exit_cap=5, rent_per_unit_area=10)
+        self.assertAlmostEqual(data["unlevered_irr"][1][2], cell.unlevered_irr())
+        self.assertAlmostEqual(data["unlevered_mult"][1][2], cell.unlevered_em())
+        self.assertAlmostEqual(data["yoc"][1][2], cell.yoc())
+        self.assertGreater(data["unlevered_irr"][0][0], data["unlevered_irr"][3][0])
+
+    def test_sensitivity_rejects_other_inputs(self):
+        response = self.client.post(
+            reverse("sensitivity_analysis"),
+            {
+                "query": create_query_data(),
+                "ranges": {"land_cost": {"start": 1, "stop": 2, "num": 2}},
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ranges", response.json())
+
+    def test_goal_seek(self):
+        url = reverse("goal_seek_analysis")
+        data = {
+            "query": create_query_data(),
+            "metric": "unlevered_irr",
+            "variable": "land_cost",
+            "target": 0.05,
+        }
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["converged"])
+        self.assertGreater(body["iterations"], 0)
+        self.assertLess(body["value"], DEAL_VALUES["land_cost"])
+        self.assertAlmostEqual(body["results"]["unlevered_irr"], 0.05)
+
+        for bracket in ({"low": 0, "high": 1000}, {"low": 10}):
+            response = self.client.post(
+                url, {**data, **bracket}, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            url,
+            {**data, "variable": "exit_cap", "target": 0.1, "low": 0, "high": 10},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_simulation(self):
+        response = self.client.post(
+            reverse("simulation_analysis"),
+            {
+                "query": create_query_data(),
+                "distributions": {
+                    "exit_cap": {"distribution": "uniform", "low": 5, "high": 6},
+                    "lease_up_period": {"distribution": "normal", "mean": 6, "std": 2},
+                },
+                "paths": 2000,
+                "seed": 1,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["paths"], 2000)
+        self.assertEqual(len(data["unl_peak_equity"]["histogram"]["counts"]), 50)
+
+    def test_simulation_requires_distribution_parameters(self):
+        response = self.client.post(
+            reverse("simulation_analysis"),
+            {
+                "query": create_query_data(),
+                "distributions": {"exit_cap": {"distribution": "normal", "mean": 5}},
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("distributions", response.json())
+
+    def test_simulation_rejects_invalid_distributions(self):
+        for distribution in (
+            {"distribution": "uniform", "low": 6, "high": 5},
+            {"distribution": "triangular", "left": 5, "mode": 7, "right": 6},
+            {"distribution": "triangular", "left": 5, "mode": 5, "right": 5},
+            {"distribution": "uniform", "low": 0, "high": 6},
+            {"distribution": "normal", "mean": 5, "std": 2},
+        ):
+            response = self.client.post(
+                reverse("simulation_analysis"),
+                {"query": create_query_data(), "distributions": {"exit_cap": distribution}},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400, distribution)
+            self.assertIn("distributions", response.json())
+
+    def export(self, output):
+        response = self.client.post(
+            f"{reverse('cash_flow_export')}?output={output}",
+            [create_query_data(), create_query_data(exit_cap=6)],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return io.BytesIO(b"".join(response.streaming_content))
+
+    def test_cash_flow_export(self):
+        exported = pd.read_csv(self.export("csv"), parse_dates=["Date"])
+        expected = create_inputs(exit_cap=6).uses_cash_flow()
+        self.assertEqual(len(exported), 2 * len(expected))
+        rows = exported[exported["deal"] == 1].drop(columns=["deal", "name"])
+        pd.testing.assert_frame_equal(rows.reset_index(drop=True), expected)
+
+    @skipUnless(export_available("parquet"), "pyarrow is not installed")
+    def test_columnar_cash_flow_export(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        expected = pd.read_csv(self.export("csv"), parse_dates=["Date"])
+        parquet = pq.read_table(self.export("parquet")).to_pandas()
+        pd.testing.assert_frame_equal(parquet, expected, check_dtype=False)
+        arrow = pa.ipc.open_stream(self.export("arrow")).read_all().to_pandas()
+        pd.testing.assert_frame_equal(arrow, parquet)
+
+    def test_columnar_export_needs_an_importable_pyarrow(self):
+        pyarrow_importable.cache_clear()
+        self.addCleanup(pyarrow_importable.cache_clear)
+        with mock.patch.dict(sys.modules, {"pyarrow": None}):
+            self.assertTrue(export_available("csv"))
+            self.assertFalse(export_available("parquet"))
+            response = self.client.post(
+                f"{reverse('cash_flow_export')}?output=arrow",
+                [create_query_data()],
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class JobHeartbeatTestCase(TransactionTestCase):
+    @override_settings(QUICKLOOK_JOB_HEARTBEAT=0.01)
+    def test_heartbeat_is_recorded_while_the_analysis_runs(self):
+        QuickLookJob.objects.create(
+            kind=QuickLookJob.SENSITIVITY,
+            payload={
+                "query": create_query_data(),
+                "ranges": {"exit_cap": {"start": 4, "stop": 7, "num": 4}},
+            },
+        )
+        job = claim_job()
+        claimed_at = job.heartbeat
+        beats = []
+
+        def slow_analysis(*args, **kwargs):
+            time.sleep(0.2)
+            beats.append(QuickLookJob.objects.get(pk=job.pk).heartbeat)
+            return {}
+
+        with mock.patch.dict(ANALYSES, {QuickLookJob.SENSITIVITY: slow_analysis}):
+            self.assertEqual(run_job(job).status, QuickLookJob.DONE)
+        self.assertGreater(beats[0], claimed_at)
+
+
+class QuickLookResultsTestCase(TestCase):
+    def test_results_are_stored_with_their_query(self):
+        response = self.client.post(
+            reverse("quick_look_analysis"), create_query_data(), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        results = QuickLookResults.objects.get()
+        self.assertEqual(response.json()["query"], results.query.pk)
+        self.assertAlmostEqual(results.unlevered_irr, create_inputs().unlevered_irr())
+
+        response = self.client.get(reverse("quick_look_detail", args=[results.query.pk]))
+        self.assertEqual(response.json()["results"]["pk"], results.pk)
+
+    def test_identical_inputs_are_not_recomputed(self):
+        url = reverse("quick_look_analysis")
+        first = self.client.post(url, create_query_data(), content_type="application/json")
+        second = self.client.post(url, create_query_data(), content_type="application/json")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(QuickLookQuery.objects.count(), 1)
+
+        other = self.client.post(
+            url, create_query_data(exit_cap=6), content_type="application/json"
+        )
+        self.assertEqual(other.status_code, 201)
+        self.assertEqual(QuickLookResults.objects.count(), 2)
+
+    def test_listing_is_paginated_and_filtered(self):
+        for exit_cap, region in ((5, "UK"), (6, "US"), (7, "UK")):
+            QuickLookQuery.objects.create(
+                **create_record(exit_cap=exit_cap, region=region), name="Test Deal"
+            )
+        url = reverse("quick_look_analysis")
+
+        first = self.client.get(url, {"page_size": 2}).json()
+        self.assertEqual([row["exit_cap"] for row in first["results"]], [7, 6])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([row["exit_cap"] for row in second["results"]], [5])
+        self.assertIsNone(second["next"])
+
+        response = self.client.get(url, {"region": "UK", "stream": "true"})
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([row["exit_cap"] for row in rows], [7, 5])
+
+        response = self.client.get(url, {"date_before": "2000-01-01", "stream": "true"})
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+        self.assertEqual(self.client.get(url, {"date_after": "01/01/2000"}).status_code, 400)
+
+    def test_bulk_rows_need_a_positive_exit_cap(self):
+        response = self.client.post(
+            reverse("bulk_analysis"),
+            [create_query_data(), create_query_data(exit_cap=0)],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("exit_cap", response.json()[1]["errors"])
+
+    def test_bulk_takes_results_saved_by_a_concurrent_request(self):
+        url = reverse("quick_look_analysis")
+
+        def run_batch_after_concurrent_save(*args, **kwargs):
+            self.client.post(url, create_query_data(), content_type="application/json")
+            return run_batch(*args, **kwargs)
+
+        with mock.patch("quicklook.analyses.run_batch", run_batch_after_concurrent_save):
+            response = self.client.post(
+                reverse("bulk_analysis"),
+                [create_query_data(), create_query_data(exit_cap=6)],
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 201)
+        saved = QuickLookResults.objects.get(query__exit_cap=DEAL_VALUES["exit_cap"])
+        self.assertEqual(response.json()[0]["results"]["pk"], saved.pk)
+        self.assertEqual(QuickLookResults.objects.count(), 2)
+
+    def test_bulk_submission(self):
+        url = reverse("bulk_analysis")
+        self.client.post(
+            reverse("quick_look_analysis"), create_query_data(), content_type="application/json"
+        )
+        rows = [
+            create_query_data(),
+            create_query_data(exit_cap=6),
+            create_query_data(region="Atlantis"),
+            create_query_data(exit_cap=6),
+        ]
+        response = self.client.post(url, rows, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([row["row"] for row in data], [0, 1, 2, 3])
+        self.assertIn("region", data[2]["errors"])
+        self.assertEqual(data[1]["results"], data[3]["results"])
+        self.assertAlmostEqual(
+            data[1]["results"]["unlevered_irr"], create_inputs(exit_cap=6).unlevered_irr()
+        )
+        self.assertEqual(QuickLookQuery.objects.count(), 2)
+        self.assertEqual(QuickLookResults.objects.count(), 2)
+
+        header = ",".join(rows[0])
+        lines = [",".join(str(value) for value in row.values()) for row in rows[:2]]
+        response = self.client.post(
+            url, "\n".join([header, *lines]), content_type="text/csv"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[1]["results"], data[1]["results"])
+
+    def test_jobs_are_run_by_the_worker(self):
+        payload = {
+            "query": create_query_data(),
+            "ranges": {"exit_cap": {"start": 4, "stop": 7, "num": 4}},
+        }
+        response = self.client.post(
+            reverse("submit_job"),
+            {"kind": "sensitivity", "payload": payload},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job["status"], "queued")
+
+        call_command("quicklook_worker", "--once", stdout=io.StringIO())
+
+        job = self.client.get(reverse("job_detail", args=[job["pk"]])).json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["progress"], 1)
+        expected = self.client.post(
+            reverse("sensitivity_analysis"), payload, content_type="application/json"
+        )
+        self.assertEqual(job["result"], expected.json())
+
+    def test_bulk_jobs_are_run_by_the_worker(self):
+        rows = [create_query_data(), create_query_data(exit_cap=6)]
+        response = self.client.post(
+            reverse("submit_job"),
+            {"kind": "bulk", "payload": rows},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+
+        call_command("quicklook_worker", "--once", stdout=io.StringIO())
+
+        job = self.client.get(reverse("job_detail", args=[response.json()["pk"]])).json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual([row["row"] for row in job["result"]], [0, 1])
+        self.assertAlmostEqual(
+            job["result"][1]["results"]["unlevered_irr"],
+            create_inputs(exit_cap=6).unlevered_irr(),
+        )
+        self.assertEqual(QuickLookResults.objects.count(), 2)
+
+    def test_stale_running_jobs_are_requeued(self):
+        payload = {
+            "query": create_query_data(),
+            "ranges": {"exit_cap": {"start": 4, "stop": 7, "num": 4}},
+        }
+        job = QuickLookJob.objects.create(kind=QuickLookJob.SENSITIVITY, payload=payload)
+        self.assertEqual(claim_job().pk, job.pk)
+        self.assertIsNone(claim_job())
+
+        QuickLookJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - datetime.timedelta(hours=1)
+        )
+        claimed = claim_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, QuickLookJob.RUNNING)
+        self.assertEqual(run_job(claimed).status, QuickLookJob.DONE)
+
+    def test_failed_jobs_keep_the_traceback_out_of_the_error(self):
+        job = QuickLookJob.objects.create(
+            kind=QuickLookJob.SENSITIVITY,
+            payload={
+                "query": create_query_data(),
+                "ranges": {"exit_cap": {"start": 4, "stop": 7, "num": 4}},
+            },
+        )
+        failing = mock.Mock(side_effect=RuntimeError("secret detail"))
+        with mock.patch.dict(ANALYSES, {QuickLookJob.SENSITIVITY: failing}), self.assertLogs(
+            "quicklook.jobs", "ERROR"
+        ) as logs:
+            job = run_job(claim_job())
+        self.assertEqual(job.status, QuickLookJob.FAILED)
+        self.assertNotIn("secret detail", job.error)
+        self.assertNotIn("Traceback", job.error)
+        self.assertIn("secret detail", "\n".join(logs.output))
+
+    def test_job_payload_is_validated_on_submission(self):
+        response = self.client.post(
+            reverse("submit_job"),
+            {"kind": "simulation", "payload": {"query": create_query_data()}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("distributions", response.json()["payload"])
+
+    def test_saved_query_cash_flow_export(self):
+        query = QuickLookQuery.objects.create(**create_record(), name="Test Deal")
+        response = self.client.get(reverse("quick_look_cash_flow", args=[query.pk]))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        exported = pd.read_csv(
+            io.BytesIO(b"".join(response.streaming_content)), parse_dates=["Date"]
+        )
+        self.assertEqual(set(exported["deal"]), {query.pk})
+        self.assertEqual(len(exported), len(create_inputs().cash_flow()))
+
+    def test_what_if_changes_are_not_saved(self):
+        query = QuickLookQuery.objects.create(**create_record(), name="Test Deal")
+        url = reverse("what_if_analysis", args=[query.pk])
+        response = self.client.patch(
+            url, {"exit_cap": 6.5, "lease_up_period": 9}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["changes"], {"exit_cap": 6.5, "lease_up_period": 9})
+        self.assertNotIn("Land Purchase", body["line_items"])
+        self.assertEqual(body["results"], create_inputs().results())
+        self.assertEqual(
+            body["what_if"], create_inputs(exit_cap=6.5, lease_up_period=9).results()
+        )
+        query.refresh_from_db()
+        self.assertEqual(query.exit_cap, 5.5)
+
+        response = self.client.patch(url, {"region": "Atlantis"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_portfolio_is_refreshed_incrementally(self):
+        queries = [
+            QuickLookQuery.objects.create(**create_record(exit_cap=exit_cap), name="Test Deal")
+            for exit_cap in (5, 6, 7)
+        ]
+        response = self.client.post(
+            reverse("portfolio_list"),
+            {"name": "Fund", "queries": [query.pk for query in queries]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        deals = [create_inputs(exit_cap=exit_cap) for exit_cap in (5, 6, 7)]
+        self.assertAlmostEqual(body["ncf"], sum(deal.unlevered_ncf() for deal in deals), 3)
+        self.assertAlmostEqual(sum(body["cash_flow"]), body["ncf"], 3)
+        irrs = [deal.unlevered_irr() for deal in deals]
+        self.assertTrue(min(irrs) < body["unlevered_irr"] < max(irrs))
+
+        url = reverse("portfolio_detail", args=[body["pk"]])
+        with mock.patch.object(
+            portfolios, "evaluate_batch", wraps=portfolios.evaluate_batch
+        ) as evaluate:
+            self.assertEqual(self.client.get(url).json(), body)
+            evaluate.assert_not_called()
+
+            QuickLookQuery.objects.filter(pk=queries[0].pk).update(exit_cap=6)
+            changed = self.client.get(url).json()
+            self.assertEqual(len(evaluate.call_args.args[0]), 1)
+            self.assertLess(changed["ncf"], body["ncf"])
+
+            response = self.client.patch(
+                url, {"queries": [queries[1].pk]}, content_type="application/json"
+            )
+            self.assertEqual(evaluate.call_count, 1)
+        self.assertAlmostEqual(response.json()["ncf"], deals[1].unlevered_ncf(), 3)
+        self.assertEqual(Portfolio.objects.get().deals.count(), 1)
+
+    def test_regions_of_an_activated_set_are_read_only(self):
+        inline = RegionAssumptionInline(AssumptionSet, admin.site)
+        request = RequestFactory().get("/")
+        request.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        draft = AssumptionSet.objects.create()
+        active = AssumptionSet.objects.create(active=True)
+        deactivated = AssumptionSet.objects.create(active=True)
+        deactivated.active = False
+        deactivated.save()
+        for permission in (
+            inline.has_add_permission,
+            inline.has_change_permission,
+            inline.has_delete_permission,
+        ):
+            self.assertTrue(permission(request, draft))
+            self.assertFalse(permission(request, active))
+            self.assertFalse(permission(request, deactivated))
+
+        set_admin = admin.site._registry[AssumptionSet]
+        self.assertNotIn("active", set_admin.get_readonly_fields(request, draft))
+        self.assertIn("active", set_admin.get_readonly_fields(request, active))
+
+    def test_markets_come_from_the_active_assumption_set(self):
+        url = reverse("quick_look_analysis")
+        data = create_query_data(region="Spain")
+        self.assertEqual(
+            self.client.post(url, data, content_type="application/json").status_code, 400
+        )
+
+        assumption_set = AssumptionSet.objects.create(active=True)
+        for region in ("UK", "Spain"):
+            assumption_set.regions.create(
+                region=region,
+                rent_periods_per_year=1,
+                debt_fees_pc=0.05,
+                disposition_pc=0.04,
+                tenant_rep_commission_pc=0.265,
+                landlord_rep_commission_pc=0.017,
+                rental_costs=0.25,
+                mass_grading_proportion=0.25,
+            )
+        response = self.client.post(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertAlmostEqual(
+            response.json()["lev_costs"],
+            create_inputs().total_unlevered_cost() * 1.05,
+        )
+
+        """
+        Results stored under other assumptions are not reused
+        """
+        response = self.client.post(url, create_query_data(), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
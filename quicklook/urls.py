@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.quick_look_analysis, name='quick_look_analysis'),
+    path('<int:pk>', views.quick_look_detail, name='quick_look_detail'),
+    path('<int:pk>/cash_flows', views.quick_look_cash_flow, name='quick_look_cash_flow'),
+    path('<int:pk>/what_if', views.what_if_analysis, name='what_if_analysis'),
+    path('cash_flows', views.cash_flow_export, name='cash_flow_export'),
+    path('bulk', views.bulk_analysis, name='bulk_analysis'),
+    path('portfolios', views.portfolio_list, name='portfolio_list'),
+    path('portfolios/<int:pk>', views.portfolio_detail, name='portfolio_detail'),
+    path('sensitivity', views.sensitivity_analysis, name='sensitivity_analysis'),
+    path('goal_seek', views.goal_seek_analysis, name='goal_seek_analysis'),
+    path('simulation', views.simulation_analysis, name='simulation_analysis'),
+    path('jobs', views.submit_job, name='submit_job'),
+    path('jobs/<int:pk>', views.job_detail, name='job_detail'),
+]
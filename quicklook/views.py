@@ -1,75 +1,472 @@
-from .ro_utils import DealValues, KeyDates, QuicklookInputs
+from .analyses import evaluate_queries, query_record, sensitivity, simulation
+from .assumptions import load_assumptions
+from .export import EXPORT_FORMATS, export_available, export_cash_flows
+from .portfolios import refresh_portfolio
+from .ro_utils import (
+    DEAL_COLUMNS,
+    DEAL_DATE_COLUMNS,
+    QuicklookInputs,
+    goal_seek,
+    input_hash,
+)
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework import status
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 import datetime
+import json
 
-from .models import QuickLookQuery
+from .models import Portfolio, QuickLookJob, QuickLookQuery, QuickLookResults
+from .pagination import QuickLookQueryPagination
+from .parsers import CSVParser
 from .serializers import *
 
+"""
+Rows fetched per round trip when streaming the saved queries
+"""
+STREAM_CHUNK_SIZE = 2000
+
 
 @api_view(["GET", "POST"])
 def quick_look_analysis(request):
     if request.method == "GET":
-        data = QuickLookQuery.objects.all()
+        filters = QuickLookQueryFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = filter_queries(QuickLookQuery.objects.all(), filters.validated_data)
+
+        if filters.validated_data["stream"]:
+            return StreamingHttpResponse(
+                stream_queries(data.order_by(*QuickLookQueryPagination.ordering)),
+                content_type="application/json",
+            )
 
+        paginator = QuickLookQueryPagination()
+        page = paginator.paginate_queryset(data, request)
         serializer = QuickLookQuerySerializer(
-            data, context={"request": request}, many=True
+            page, context={"request": request}, many=True
         )
 
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
     elif request.method == "POST":
-        serializer = QuickLookQuerySerializer(data=request.data)
-        print(request.data)
-        if serializer.is_valid():
-            serializer.save()
-            data = serializer.data
-            format = "%Y-%m-%d"
+        assumptions = load_assumptions()
+        serializer = QuickLookQuerySerializer(
+            data=request.data, context={"assumptions": assumptions}
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        """
+        Identical inputs are answered from the stored results
+        """
+        key = input_hash(serializer.validated_data, assumptions.version)
+        results = QuickLookResults.objects.filter(input_hash=key).first()
+        if results is not None:
+            serializer = QuickLookResultsSerializer(results)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        """
+        In input data, ensure date days are set to 1. This is to maintain consistency.1
+        """
+        input_data = QuicklookInputs.from_record(
+            query_record(serializer.validated_data), assumptions
+        )
+        values = input_data.results()
+        try:
+            with transaction.atomic():
+                query = serializer.save()
+                results = QuickLookResults.objects.create(
+                    query=query, input_hash=key, **values
+                )
+        except IntegrityError:
             """
-            In input data, ensure date days are set to 1. This is to maintain consistency.1
+            The same inputs were stored by a concurrent request
             """
-            input_data = QuicklookInputs(
-                name=data["name"],
-                key_dates=KeyDates(
-                    land_purchase_date=datetime.datetime.strptime(
-                        data["land_purchase_date"], format
-                    ).replace(day=1),
-                    building_sale=datetime.datetime.strptime(
-                        data["building_sale"], format
-                    ).replace(day=1),
-                    mass_grading_start=datetime.datetime.strptime(
-                        data["mass_grading_start"], format
-                    ).replace(day=1),
-                    rent_free_period=data["rent_free_period"],
-                    lease_up_period=data["lease_up_period"],
-                ),
-                values=DealValues(
-                    region=data["region"],
-                    total_area=data["total_area"],
-                    rent_per_unit_area=data["rent_per_unit_area"],
-                    exit_cap=data["exit_cap"],
-                    land_cost=data["land_cost"],
-                    building_hard_cost=data["building_hard_cost"],
-                    building_soft_cost=data["building_soft_cost"],
-                    tenant_improvements=data["tenant_improvements"],
-                    cash_contributions=data["cash_contributions"],
-                ),
-            )
+            results = QuickLookResults.objects.filter(input_hash=key).first()
+            if results is None:
+                raise
+            serializer = QuickLookResultsSerializer(results)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        serializer = QuickLookResultsSerializer(results)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+@parser_classes([JSONParser, CSVParser])
+def bulk_analysis(request):
+    """
+    Save and evaluate many queries, sent as a JSON array or as CSV with a header row
+
+    Valid rows are saved and evaluated together even when other rows are rejected;
+    the response holds, in row order, either the results or the errors of each row.
+    Rows whose inputs were evaluated before get their stored results back.
+    """
+    assumptions = load_assumptions()
+    serializer = BulkSerializer(data=request.data, context={"assumptions": assumptions})
+    if serializer.is_valid():
+        rows = list(enumerate(serializer.validated_data))
+        errors = {}
+    elif isinstance(serializer.errors, dict):
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        errors = {row: error for row, error in enumerate(serializer.errors) if error}
+        rows = [
+            (row, serializer.child.run_validation(data))
+            for row, data in enumerate(request.data)
+            if row not in errors
+        ]
+
+    results, created = evaluate_queries(
+        [data for _, data in rows],
+        workers=settings.QUICKLOOK_WORKERS,
+        assumptions=assumptions,
+    )
+
+    response = [{"row": row, "errors": error} for row, error in errors.items()]
+    response += [
+        {"row": row, "results": QuickLookResultsSerializer(result).data}
+        for (row, _), result in zip(rows, results)
+    ]
+    response.sort(key=lambda row: row["row"])
+
+    if not rows:
+        return Response(response, status=status.HTTP_400_BAD_REQUEST)
+    return Response(
+        response, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    )
+
+
+def filter_queries(queries, filters):
+    """
+    Saved queries of a region and within a range of days, both ends included
+    """
+    if "region" in filters:
+        queries = queries.filter(region=filters["region"])
+    if "date_after" in filters:
+        queries = queries.filter(date__gte=start_of_day(filters["date_after"]))
+    if "date_before" in filters:
+        queries = queries.filter(
+            date__lt=start_of_day(filters["date_before"] + datetime.timedelta(days=1))
+        )
+    return queries
+
 
-            results = QuickLookResults(
-                unlevered_irr=input_data.unlevered_irr(),
-                unlevered_mult=input_data.unlevered_em(),
-                yoc=input_data.yoc(),
-                ncf=input_data.unlevered_ncf(),
-                unl_costs=input_data.total_unlevered_cost(),
-                lev_costs=input_data.total_levered_cost(),
-                unl_peak_equity=input_data.unlevered_peak_equity(),
-                net_sale_price=input_data.net_sale_price(),
-                gross_sale_price=input_data.values.gross_sale_price,
+def start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def stream_queries(queries, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield the queries as one JSON array, chunk_size rows at a time, so that neither
+    the rows nor the document are ever held in memory at once
+    """
+    serializer = QuickLookQuerySerializer()
+    separator = "["
+    for query in queries.iterator(chunk_size=chunk_size):
+        yield separator + json.dumps(serializer.to_representation(query))
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+@api_view(["GET"])
+def quick_look_detail(request, pk):
+    query = get_object_or_404(QuickLookQuery, pk=pk)
+    results = QuickLookResults.objects.filter(query=query).first()
+    return Response(
+        {
+            "query": QuickLookQuerySerializer(query).data,
+            "results": QuickLookResultsSerializer(results).data if results else None,
+        }
+    )
+
+
+def query_inputs(query, assumptions):
+    """
+    The QuicklookInputs of a saved QuickLookQuery
+    """
+    data = {name: getattr(query, name) for name in ("name",) + DEAL_COLUMNS}
+    return QuicklookInputs.from_record(query_record(data), assumptions)
+
+
+def export_response(deals, output):
+    """
+    Stream the cash flows of the (key, QuicklookInputs) pairs in deals as a download
+    """
+    if not export_available(output):
+        return Response(
+            {"output": [f"The {output} export needs the pyarrow package."]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    response = StreamingHttpResponse(
+        export_cash_flows(deals, output), content_type=EXPORT_FORMATS[output]
+    )
+    response["Content-Disposition"] = f'attachment; filename="cash_flows.{output}"'
+    return response
+
+
+@api_view(["GET", "POST"])
+@parser_classes([JSONParser, CSVParser])
+def cash_flow_export(request):
+    """
+    Export the monthly cash flow line items of many deals as CSV, an Arrow IPC stream
+    or Parquet, chosen by the "output" query parameter
+
+    GET exports the saved queries, filtered as the quick_look_analysis listing and
+    keyed by their pk, leaving out those of regions the current assumptions no longer
+    cover. POST exports the queries sent as a JSON array or CSV, keyed by their row.
+    """
+    options = CashFlowExportSerializer(data=request.query_params)
+    if not options.is_valid():
+        return Response(options.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    assumptions = load_assumptions()
+    if request.method == "GET":
+        queries = filter_queries(
+            QuickLookQuery.objects.filter(region__in=list(assumptions.assumptions)),
+            options.validated_data,
+        )
+        deals = (
+            (query.pk, query_inputs(query, assumptions))
+            for query in queries.order_by(*QuickLookQueryPagination.ordering).iterator(
+                chunk_size=STREAM_CHUNK_SIZE
             )
+        )
+    else:
+        serializer = QuickLookQuerySerializer(
+            data=request.data,
+            many=True,
+            max_length=MAX_BULK_ROWS,
+            context={"assumptions": assumptions},
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        deals = (
+            (row, QuicklookInputs.from_record(query_record(data), assumptions))
+            for row, data in enumerate(serializer.validated_data)
+        )
+
+    return export_response(deals, options.validated_data["output"])
 
-            serializer = QuickLookResultsSerializer(results)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+@api_view(["GET"])
+def quick_look_cash_flow(request, pk):
+    """
+    Export the monthly cash flow line items of one saved query, see cash_flow_export
+    """
+    options = CashFlowExportSerializer(data=request.query_params)
+    if not options.is_valid():
+        return Response(options.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    query = get_object_or_404(QuickLookQuery, pk=pk)
+    assumptions = load_assumptions()
+    if query.region not in assumptions:
+        return Response(
+            {"region": [f"There are no assumptions for {query.region}."]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return export_response(
+        [(query.pk, query_inputs(query, assumptions))], options.validated_data["output"]
+    )
+
+
+@api_view(["PATCH"])
+def what_if_analysis(request, pk):
+    """
+    Evaluate a saved query with some of its inputs changed, without saving anything
+
+    The body holds the changed QuickLookQuery fields. The saved query is evaluated
+    first and only the line items that depend on the changed inputs are then
+    recomputed (see QuicklookInputs.update).
+    """
+    query = get_object_or_404(QuickLookQuery, pk=pk)
+    assumptions = load_assumptions()
+    if query.region not in assumptions:
+        return Response(
+            {"region": [f"There are no assumptions for {query.region}."]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    serializer = QuickLookQuerySerializer(
+        query, data=request.data, partial=True, context={"assumptions": assumptions}
+    )
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    changes = {
+        name: value.replace(day=1) if name in DEAL_DATE_COLUMNS else value
+        for name, value in serializer.validated_data.items()
+        if name in DEAL_COLUMNS
+    }
+    inputs = query_inputs(query, assumptions)
+    results = inputs.results()
+    line_items = inputs.update(assumptions, **changes)
+    return Response(
+        {
+            "query": query.pk,
+            "changes": {name: request.data[name] for name in changes},
+            "line_items": list(line_items),
+            "results": results,
+            "what_if": inputs.results(),
+        }
+    )
+
+
+def portfolio_response(portfolio, status_code=status.HTTP_200_OK):
+    """
+    The portfolio, refreshed under the active assumptions
+    """
+    try:
+        portfolio = refresh_portfolio(portfolio.pk, load_assumptions())
+    except ValueError as error:
+        return Response(
+            {"non_field_errors": [str(error)]}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(PortfolioSerializer(portfolio).data, status=status_code)
+
+
+@api_view(["GET", "POST"])
+def portfolio_list(request):
+    """
+    GET lists the portfolios as last refreshed. POST creates one from its "name" and
+    the pks of its "queries" and returns it evaluated.
+    """
+    if request.method == "GET":
+        return Response(PortfolioSerializer(Portfolio.objects.order_by("pk"), many=True).data)
+
+    serializer = PortfolioSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return portfolio_response(serializer.save(), status.HTTP_201_CREATED)
+
+
+@api_view(["GET", "PATCH", "DELETE"])
+def portfolio_detail(request, pk):
+    """
+    The fund-level cash flow and metrics of a portfolio
+
+    Only the deals changed since the last request, and those added to the
+    portfolio, are evaluated again (see quicklook.portfolios).
+    """
+    portfolio = get_object_or_404(Portfolio, pk=pk)
+    if request.method == "DELETE":
+        portfolio.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    if request.method == "PATCH":
+        serializer = PortfolioSerializer(portfolio, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+    return portfolio_response(portfolio)
+
+
+@api_view(["POST"])
+def sensitivity_analysis(request):
+    """
+    Evaluate one deal over a grid of exit cap, rent and hard cost values
+
+    Each entry of "ranges" sweeps one input over "num" values from "start" to "stop".
+    The metrics come back as nested lists indexed by the ranges in the order given.
+    """
+    assumptions = load_assumptions()
+    serializer = SensitivitySerializer(
+        data=request.data, context={"assumptions": assumptions}
+    )
+    if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(sensitivity(serializer.validated_data, assumptions=assumptions))
+
+
+@api_view(["POST"])
+def goal_seek_analysis(request):
+    """
+    Solve for the value of one input ("variable") at which a metric hits "target"
+
+    The solution is looked for between "low" and "high" when given, and otherwise
+    between a tenth and ten times the input of the query. The response holds the
+    solution, the number of iterations it took and the results of the solved deal.
+    """
+    assumptions = load_assumptions()
+    serializer = GoalSeekSerializer(data=request.data, context={"assumptions": assumptions})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    record = query_record(data["query"])
+    bracket = (data["low"], data["high"]) if "low" in data else None
+    try:
+        solution = goal_seek(
+            record, data["metric"], data["variable"], data["target"], bracket, assumptions
+        )
+    except ValueError as error:
+        return Response(
+            {"non_field_errors": [str(error)]}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    inputs = QuicklookInputs.from_record({**record, data["variable"]: solution.value}, assumptions)
+    return Response(
+        {
+            "metric": data["metric"],
+            "variable": data["variable"],
+            "target": data["target"],
+            "value": solution.value,
+            "achieved": solution.metric,
+            "converged": solution.converged,
+            "iterations": solution.iterations,
+            "results": inputs.results(),
+        }
+    )
+
+
+@api_view(["POST"])
+def simulation_analysis(request):
+    """
+    Monte Carlo simulation of one deal
+
+    "distributions" gives a distribution for any of exit_cap, rent_per_unit_area,
+    building_hard_cost and lease_up_period. The response holds IRR and peak equity
+    percentiles and histograms over "paths" draws, the seed that reproduces them and
+    the throughput of each of the QUICKLOOK_WORKERS processes that evaluated them.
+    """
+    assumptions = load_assumptions()
+    serializer = SimulationSerializer(
+        data=request.data, context={"assumptions": assumptions}
+    )
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        simulation(
+            serializer.validated_data,
+            workers=settings.QUICKLOOK_WORKERS,
+            assumptions=assumptions,
+        )
+    )
+
+
+@api_view(["POST"])
+def submit_job(request):
+    """
+    Queue a sensitivity, simulation or bulk analysis for the quicklook_worker command
+
+    The body holds the "kind" of analysis and, as "payload", the body its endpoint
+    takes. Poll the returned job for its progress and result.
+    """
+    serializer = QuickLookJobSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer.save()
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+def job_detail(request, pk):
+    job = get_object_or_404(QuickLookJob, pk=pk)
+    return Response(QuickLookJobSerializer(job).data)
@@ -1,8 +1,74 @@
 from django.contrib import admin
+from django.db.models import Count, Sum
 
+from .caching import INDEX, bump_version_on_commit, restaurant_scope
 from .models import Restaurant, Review
 
 # Register your models here.
 
-admin.site.register(Restaurant)
-admin.site.register(Review)
+
+class BumpVersionAdmin(admin.ModelAdmin):
+    """
+    Changes made in the admin invalidate the cached pages showing them, as the views'
+    writes do. restaurant_field is the field holding the restaurant of a row.
+    """
+    restaurant_field = 'pk'
+
+    def page_scopes(self, queryset):
+        restaurants = queryset.order_by().values_list(self.restaurant_field, flat=True)
+        return [INDEX, *(restaurant_scope(id) for id in restaurants.distinct())]
+
+    def save_model(self, request, obj, form, change):
+        before = self.page_scopes(self.model.objects.filter(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        after = self.page_scopes(self.model.objects.filter(pk=obj.pk))
+        bump_version_on_commit(*before, *after)
+
+    def delete_model(self, request, obj):
+        scopes = self.page_scopes(self.model.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        bump_version_on_commit(*scopes)
+
+    def delete_queryset(self, request, queryset):
+        scopes = self.page_scopes(queryset)
+        super().delete_queryset(request, queryset)
+        bump_version_on_commit(*scopes)
+
+
+admin.site.register(Restaurant, BumpVersionAdmin)
+
+
+@admin.register(Review)
+class ReviewAdmin(BumpVersionAdmin):
+    """
+    Reviews saved or deleted in the admin update the aggregates of their restaurants,
+    as add_review does
+    """
+    # The change list shows str(review), which names the restaurant
+    list_select_related = ['restaurant']
+    restaurant_field = 'restaurant'
+
+    def save_model(self, request, obj, form, change):
+        old = Review.objects.filter(pk=obj.pk).values('restaurant', 'rating').first()
+        super().save_model(request, obj, form, change)
+        if old is None:
+            obj.restaurant.add_rating(obj.rating)
+        elif old['restaurant'] == obj.restaurant_id:
+            obj.restaurant.change_ratings(0, obj.rating - old['rating'])
+        else:
+            Restaurant(pk=old['restaurant']).remove_rating(old['rating'])
+            obj.restaurant.add_rating(obj.rating)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        obj.restaurant.remove_rating(obj.rating)
+
+    def delete_queryset(self, request, queryset):
+        removed = list(
+            queryset.order_by().values('restaurant').annotate(
+                reviews=Count('id'), ratings=Sum('rating')
+            )
+        )
+        super().delete_queryset(request, queryset)
+        for row in removed:
+            Restaurant(pk=row['restaurant']).change_ratings(-row['reviews'], -row['ratings'])
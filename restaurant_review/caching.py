@@ -0,0 +1,105 @@
+"""
+Rendered pages of restaurant_review in the default cache
+
+Pages are versioned by what they show. The index has its own version, and the
+details and reviews pages of a restaurant share a version of that restaurant.
+add_restaurant and add_review replace the versions their writes affect with new ones
+once the writes commit, so that a write leaves the pages rendered before it
+unreachable, to expire in its own time. A review therefore re-renders the index and
+its own restaurant's pages, not those of every other restaurant. Every key also holds
+the version of all pages, which rebuild_ratings replaces. Pages are the same for
+every visitor, so one copy serves them all.
+
+Replacing a version is a single set, atomic in every backend, where incrementing it
+would be a read-modify-write with the DatabaseCache that concurrent writes could undo.
+"""
+import functools
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+TIMEOUT = 60 * 60 * 24
+
+"""
+The scopes pages are versioned by
+"""
+ALL_PAGES = 'all'
+INDEX = 'index'
+
+
+def restaurant_scope(id):
+    return f'restaurant:{id}'
+
+
+def version_key(scope):
+    return f'restaurant_review:version:{scope}'
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def version(scope):
+    """
+    The current version of a scope. A cache that lost it starts again from a new one.
+    """
+    return cache.get_or_set(version_key(scope), new_version, timeout=None)
+
+
+def bump_version(*scopes):
+    cache.set_many({version_key(scope): new_version() for scope in scopes}, timeout=None)
+
+
+def bump_version_on_commit(*scopes):
+    """
+    Bump the versions once the current transaction commits, so that a page rendered
+    before the commit cannot be cached under the new versions
+    """
+    transaction.on_commit(lambda: bump_version(*scopes))
+
+
+def cache_page_versioned(scope, params=()):
+    """
+    Serve the successful GET responses of a view from the cache
+
+    Parameters
+    ----------
+    scope : string or callable
+        The scope of the view's pages, or a function of the view's URL arguments that
+        returns it, such as restaurant_scope
+    params: tuple
+        The query string parameters the view reads. Others do not change the key, so
+        that they cannot fill the cache with copies of a page.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def cached_view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            page_scope = scope(**kwargs) if callable(scope) else scope
+            arguments = json.dumps(
+                [kwargs, [request.GET.get(name) for name in params]], sort_keys=True
+            )
+            key = 'restaurant_review:page:{}:{}:{}:{}'.format(
+                view.__name__,
+                version(ALL_PAGES),
+                version(page_scope),
+                hashlib.sha256(arguments.encode()).hexdigest(),
+            )
+            page = cache.get(key)
+            if page is not None:
+                content, content_type = page
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.content, response['Content-Type']), TIMEOUT)
+            return response
+
+        return cached_view
+
+    return decorator
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from restaurant_review.caching import ALL_PAGES, bump_version
+from restaurant_review.models import Restaurant, rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the review count and rating of every restaurant from its reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Restaurants updated per transaction, by ranges of primary keys",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pks = Restaurant.objects.order_by("pk").values_list("pk", flat=True)
+        updated = 0
+        begin = pks.first()
+        while begin is not None:
+            end = pks.filter(pk__gte=begin)[batch_size - 1 : batch_size].first()
+            batch = Restaurant.objects.filter(pk__gte=begin)
+            if end is not None:
+                batch = batch.filter(pk__lte=end)
+            with transaction.atomic():
+                updated += batch.update(**rating_aggregates())
+            begin = None if end is None else pks.filter(pk__gt=end).first()
+        bump_version(ALL_PAGES)
+        self.stdout.write(f"Rebuilt the ratings of {updated} restaurants")
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.4 on 2026-10-16 21:15
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """
+    The aggregates of the existing reviews, as computed by rating_aggregates
+    """
+    Restaurant = apps.get_model("restaurant_review", "Restaurant")
+    Review = apps.get_model("restaurant_review", "Review")
+    reviews = Review.objects.filter(restaurant=OuterRef("pk")).order_by().values("restaurant")
+    Restaurant.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(value=Count("pk")).values("value")), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum("rating")).values("value")), 0),
+        avg_rating=Coalesce(
+            Subquery(reviews.annotate(value=Avg("rating")).values("value")),
+            0.0,
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_review', '0002_alter_review_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
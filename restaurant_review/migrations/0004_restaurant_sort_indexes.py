@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-16 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_review', '0003_restaurant_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['name', 'id'], name='restaurant_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-avg_rating', '-id'], name='restaurant_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-review_count', '-id'], name='restaurant_reviews_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.4 on 2026-10-16 21:18
+
+from django.db import migrations, models
+
+from restaurant_review.operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('restaurant_review', '0004_restaurant_sort_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='review',
+            index=models.Index(fields=['restaurant', '-review_date', '-id'], name='review_restaurant_date_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+from restaurant_review.operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+    """
+    CREATE INDEX CONCURRENTLY cannot run in a transaction, and builds the index
+    without blocking writes to the reviews
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('restaurant_review', '0005_review_restaurant_date_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='review',
+            index=models.Index(fields=['restaurant', 'rating'], name='review_restaurant_rating_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 
 # Create your models here.
 
@@ -7,10 +9,73 @@ class Restaurant(models.Model):
     name = models.CharField(max_length=50)
     street_address = models.CharField(max_length=50)
     description = models.CharField(max_length=250)
+    """
+    Aggregates of the restaurant's reviews, kept up to date by add_review so that
+    listing restaurants never has to join the reviews. rebuild_ratings recomputes
+    them from the reviews. avg_rating is 0 until the first review, so that every sort
+    of the index has a non-null key.
+    """
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
+
+    class Meta:
+        """
+        One index per sort of the index page, in the order it pages through, with the
+        primary key last to break ties
+        """
+        indexes = [
+            models.Index(fields=["name", "id"], name="restaurant_name_id_idx"),
+            models.Index(fields=["-avg_rating", "-id"], name="restaurant_rating_id_idx"),
+            models.Index(fields=["-review_count", "-id"], name="restaurant_reviews_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def change_ratings(self, reviews, ratings):
+        """
+        Add reviews to the review count and ratings to the rating sum, either of which
+        can be negative, in a single UPDATE that reads the current column values so that
+        concurrent reviews are not lost
+        """
+        review_count = F("review_count") + reviews
+        rating_sum = F("rating_sum") + ratings
+        Restaurant.objects.filter(pk=self.pk).update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            avg_rating=Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(review_count, 0),
+                0.0,
+                output_field=FloatField(),
+            ),
+        )
+
+    def add_rating(self, rating):
+        self.change_ratings(1, rating)
+
+    def remove_rating(self, rating):
+        self.change_ratings(-1, -rating)
+
+
+def rating_aggregates():
+    """
+    The review_count, rating_sum and avg_rating of each restaurant as subqueries over
+    its reviews, to update restaurants with
+    """
+    reviews = Review.objects.filter(restaurant=OuterRef("pk")).order_by().values("restaurant")
+    return {
+        "review_count": Coalesce(
+            Subquery(reviews.annotate(value=Count("rating")).values("value")), 0
+        ),
+        "rating_sum": Coalesce(Subquery(reviews.annotate(value=Sum("rating")).values("value")), 0),
+        "avg_rating": Coalesce(
+            Subquery(reviews.annotate(value=Avg("rating")).values("value")),
+            0.0,
+            output_field=FloatField(),
+        ),
+    }
+
 
 class Review(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
@@ -19,5 +84,18 @@ class Review(models.Model):
     review_text = models.CharField(max_length=500)
     review_date = models.DateTimeField('review date')
 
+    class Meta:
+        """
+        The reviews of a restaurant newest first, for the details page, and its
+        ratings, which the index covers so that rating_aggregates and rating
+        distributions read the index alone
+        """
+        indexes = [
+            models.Index(
+                fields=["restaurant", "-review_date", "-id"], name="review_restaurant_date_idx"
+            ),
+            models.Index(fields=["restaurant", "rating"], name="review_restaurant_rating_idx"),
+        ]
+
     def __str__(self):
         return f"{self.restaurant.name} ({self.review_date:%x})"
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Keyset pagination of the restaurant index and of the reviews of a restaurant
+
+A page is the rows that follow the last row of the previous page in the sort order,
+rather than an offset, so that the database seeks the index of the sort to the cursor
+and reads a single page whatever its depth. The cursor is the sort key and primary
+key of that last row, encoded for the query string.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 25
+
+"""
+The ordering of every sort, matching an index of Restaurant, with the primary key last
+so that rows with the same sort key keep a stable order
+"""
+SORTS = {
+    "name": ("name", "id"),
+    "rating": ("-avg_rating", "-id"),
+    "reviews": ("-review_count", "-id"),
+}
+DEFAULT_SORT = "name"
+
+"""
+The reviews of a restaurant, newest first, matching the (restaurant, review_date, id)
+index of Review
+"""
+REVIEW_ORDERING = ("-review_date", "-id")
+
+
+def encode_cursor(values):
+    """
+    Dates and times keep their microseconds, which the cursor needs to tell apart
+    reviews written in the same second
+    """
+    cursor = json.dumps(values, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor, field):
+    """
+    The sort key, parsed by the model field it sorts on, and primary key of a cursor,
+    or ValueError when it is not one
+    """
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor {cursor!r}") from error
+    if value is None or isinstance(value, (list, dict)) or not isinstance(pk, int):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    try:
+        return field.to_python(value), pk
+    except ValidationError as error:
+        raise ValueError(f"Invalid cursor {cursor!r}") from error
+
+
+def after(queryset, ordering, value, pk):
+    """
+    The rows of queryset that follow (value, pk) in ordering
+
+    The bound on the sort key alone lets the database start its index scan at the
+    cursor, and the rest of the condition skips the rows of that key already shown.
+    """
+    field, _ = ordering
+    name = field.lstrip("-")
+    if field.startswith("-"):
+        return queryset.filter(
+            Q(**{f"{name}__lte": value}), Q(**{f"{name}__lt": value}) | Q(pk__lt=pk)
+        )
+    return queryset.filter(
+        Q(**{f"{name}__gte": value}), Q(**{f"{name}__gt": value}) | Q(pk__gt=pk)
+    )
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of queryset in the given ordering
+
+    Parameters
+    ----------
+    queryset : QuerySet
+        The rows to page through
+    ordering: tuple
+        The sort field then the primary key, each prefixed with "-" when descending,
+        such as a value of SORTS
+    cursor: string
+        The next_cursor of the previous page, None for the first page
+    page_size: int
+        The number of rows in a page
+
+    Output
+    ------
+    The rows of the page and the cursor of the next page, None on the last page.
+    An invalid cursor raises ValueError.
+    """
+    if cursor:
+        field = queryset.model._meta.get_field(ordering[0].lstrip("-"))
+        queryset = after(queryset, ordering, *decode_cursor(cursor, field))
+    rows = list(queryset.order_by(*ordering)[: page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, ordering[0].lstrip("-")), last.pk])
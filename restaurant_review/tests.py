@@ -1,9 +1,19 @@
 import datetime
+import io
+from unittest import skipUnless
 
-from django.test import TestCase
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Restaurant
+from .caching import INDEX, bump_version, restaurant_scope, version, version_key
+from .models import Restaurant, Review, rating_aggregates
+from .pagination import PAGE_SIZE, REVIEW_ORDERING, SORTS, after, encode_cursor, keyset_page
 
 
 def create_restaurant():
@@ -16,6 +26,9 @@ def create_restaurant():
 
 # Initial tests created with GitHub Copilot
 class RestaurantRoutesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_restaurant_review_page_loads(self):
         restaurant = create_restaurant()
         response = self.client.get(reverse("index"))
@@ -61,6 +74,134 @@ class RestaurantRoutesTestCase(TestCase):
         self.assertEqual(review.review_text, "Test Review")
         self.assertRedirects(response, reverse("details", args=(restaurant.id,)))
 
+    def test_add_review_updates_rating(self):
+        restaurant = create_restaurant()
+        for rating in (5, 2):
+            self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Test User", "rating": rating, "review_text": "Test Review"},
+            )
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.review_count, 2)
+        self.assertEqual(restaurant.rating_sum, 7)
+        self.assertEqual(restaurant.avg_rating, 3.5)
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "3.5")
+        self.assertContains(response, "2  reviews")
+
+    def test_index_pages(self):
+        Restaurant.objects.bulk_create(
+            Restaurant(name=f"Restaurant {i:03}", street_address="", description="")
+            for i in range(PAGE_SIZE + 5)
+        )
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Restaurant 000")
+        self.assertNotContains(response, f"Restaurant {PAGE_SIZE:03}")
+        next_cursor = response.context["next_cursor"]
+
+        response = self.client.get(reverse("index"), {"sort": "name", "after": next_cursor})
+        self.assertContains(response, f"Restaurant {PAGE_SIZE:03}")
+        self.assertNotContains(response, "Restaurant 000")
+        self.assertIsNone(response.context["next_cursor"])
+
+        response = self.client.get(reverse("index"), {"after": "not a cursor"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("index"), {"sort": "rating", "after": encode_cursor(["abc", 1])}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_details_pages_reviews(self):
+        restaurant = create_restaurant()
+        first = timezone.now()
+        for i in range(PAGE_SIZE + 3):
+            restaurant.review_set.create(
+                user_name=f"User {i:03}",
+                rating=4,
+                review_text="Test Review",
+                review_date=first + datetime.timedelta(microseconds=i // 2),
+            )
+        restaurant.add_rating(4)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("details", args=(restaurant.id,)))
+        self.assertContains(response, "4.0 (1 ")
+        self.assertContains(response, f"User {PAGE_SIZE + 2:03}")
+        self.assertNotContains(response, "User 002")
+        self.assertContains(response, "Load more")
+
+        response = self.client.get(
+            reverse("reviews", args=(restaurant.id,)),
+            {"after": response.context["next_cursor"]},
+        )
+        self.assertEqual(
+            [review.user_name for review in response.context["reviews"]],
+            ["User 002", "User 001", "User 000"],
+        )
+        self.assertNotContains(response, "Load more")
+
+        response = self.client.get(
+            reverse("reviews", args=(restaurant.id,)), {"after": encode_cursor(["abc", 1])}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_cached_until_write(self):
+        restaurant = create_restaurant()
+        self.client.get(reverse("index"))
+        details = self.client.get(reverse("details", args=(restaurant.id,)))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("index")).status_code, 200)
+            cached = self.client.get(reverse("details", args=(restaurant.id,)))
+        self.assertEqual(cached.content, details.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Test User", "rating": 3, "review_text": "Cached Review"},
+            )
+        self.assertContains(
+            self.client.get(reverse("details", args=(restaurant.id,))), "Cached Review"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_restaurant"),
+                {
+                    "restaurant_name": "New Restaurant",
+                    "street_address": "1 New Street",
+                    "description": "New Description",
+                },
+            )
+        self.assertContains(self.client.get(reverse("index")), "New Restaurant")
+
+    def test_bump_replaces_the_version(self):
+        before, index = version(restaurant_scope(1)), version(INDEX)
+        self.assertEqual(version(restaurant_scope(1)), before)
+        bump_version(restaurant_scope(1))
+        self.assertNotEqual(version(restaurant_scope(1)), before)
+        self.assertEqual(version(INDEX), index)
+        cache.delete(version_key(INDEX))
+        self.assertNotEqual(version(INDEX), index)
+
+    def test_review_keeps_other_restaurants_cached(self):
+        restaurant, other = create_restaurant(), create_restaurant()
+        self.client.get(reverse("details", args=(other.id,)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Test User", "rating": 3, "review_text": "Cached Review"},
+            )
+        with self.assertNumQueries(0):
+            self.client.get(reverse("details", args=(other.id,)))
+        with self.assertNumQueries(2):
+            self.client.get(reverse("details", args=(restaurant.id,)))
+
+    def test_unused_query_parameters_share_the_cached_page(self):
+        self.client.get(reverse("index"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("index"), {"unused": "1"})
+
 
 class RestaurantModels(TestCase):
     def test_create_restaurant(self):
@@ -82,3 +223,144 @@ class RestaurantModels(TestCase):
         self.assertEqual(review.rating, 5)
         self.assertEqual(review.review_text, "Test Review")
         self.assertEqual(str(review), "Test Restaurant (01/01/01)")
+
+    def test_rebuild_ratings(self):
+        restaurants = [create_restaurant() for _ in range(3)]
+        for restaurant, ratings in zip(restaurants, ((1, 2, 4), (5,), ())):
+            for rating in ratings:
+                restaurant.review_set.create(
+                    user_name="Test User",
+                    rating=rating,
+                    review_text="Test Review",
+                    review_date=datetime.datetime(2001, 1, 1),
+                )
+        output = io.StringIO()
+        call_command("rebuild_ratings", batch_size=2, stdout=output)
+        self.assertIn("3 restaurants", output.getvalue())
+        self.assertEqual(
+            [
+                (restaurant.review_count, restaurant.rating_sum, restaurant.avg_rating)
+                for restaurant in Restaurant.objects.order_by("pk")
+            ],
+            [(3, 7, 7 / 3), (1, 5, 5.0), (0, 0, 0.0)],
+        )
+
+    def test_admin_keeps_ratings(self):
+        review_admin = admin.site._registry[Review]
+        request = RequestFactory().post("/")
+        first, second = create_restaurant(), create_restaurant()
+
+        def aggregates():
+            return [
+                (restaurant.review_count, restaurant.rating_sum, restaurant.avg_rating)
+                for restaurant in Restaurant.objects.order_by("pk")
+            ]
+
+        reviews = [
+            Review(
+                restaurant=first,
+                user_name="Test User",
+                rating=rating,
+                review_text="Test Review",
+                review_date=timezone.now(),
+            )
+            for rating in (2, 4, 5)
+        ]
+        for review in reviews:
+            review_admin.save_model(request, review, None, False)
+        self.assertEqual(aggregates(), [(3, 11, 11 / 3), (0, 0, 0.0)])
+
+        reviews[0].rating = 3
+        review_admin.save_model(request, reviews[0], None, True)
+        reviews[1].restaurant = second
+        review_admin.save_model(request, reviews[1], None, True)
+        self.assertEqual(aggregates(), [(2, 8, 4.0), (1, 4, 4.0)])
+
+        review_admin.delete_model(request, reviews[1])
+        review_admin.delete_queryset(request, Review.objects.all())
+        self.assertEqual(aggregates(), [(0, 0, 0.0), (0, 0, 0.0)])
+
+    def test_keyset_page(self):
+        """
+        Paging through every sort, with ties on the sort key across page boundaries,
+        visits each restaurant once in the order of the sort
+        """
+        Restaurant.objects.bulk_create(
+            Restaurant(
+                name=f"Restaurant {i % 4}",
+                street_address="",
+                description="",
+                review_count=i % 3,
+                avg_rating=(i % 5) / 2,
+            )
+            for i in range(23)
+        )
+        for sort, ordering in SORTS.items():
+            expected = list(Restaurant.objects.order_by(*ordering).values_list("pk", flat=True))
+            pks, cursor = [], None
+            while True:
+                rows, cursor = keyset_page(Restaurant.objects.all(), ordering, cursor, page_size=4)
+                pks += [row.pk for row in rows]
+                if cursor is None:
+                    break
+            self.assertEqual(pks, expected, sort)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are those of Postgres")
+class QueryPlans(TestCase):
+    """
+    The test tables are too small for the planner to prefer an index on its own, so
+    every plan is taken with sequential scans, bitmap scans and sorts discouraged. An
+    index scan that remains, and no sort, show the index serves the query and its order.
+    """
+
+    def setUp(self):
+        self.restaurant = create_restaurant()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL enable_seqscan = off; SET LOCAL enable_bitmapscan = off; "
+                "SET LOCAL enable_sort = off"
+            )
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f"using {index} on", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_review_pages(self):
+        reviews = self.restaurant.review_set.all()
+        self.assertUsesIndex(
+            reviews.order_by(*REVIEW_ORDERING)[: PAGE_SIZE + 1], "review_restaurant_date_idx"
+        )
+        self.assertUsesIndex(
+            after(reviews, REVIEW_ORDERING, timezone.now(), 10).order_by(*REVIEW_ORDERING)[
+                : PAGE_SIZE + 1
+            ],
+            "review_restaurant_date_idx",
+        )
+
+    def test_ratings(self):
+        aggregates = {f"new_{name}": value for name, value in rating_aggregates().items()}
+        plan = Restaurant.objects.filter(pk=self.restaurant.pk).annotate(**aggregates).explain()
+        self.assertEqual(plan.count("Index Only Scan using review_restaurant_rating_idx"), 3)
+        self.assertUsesIndex(
+            Review.objects.filter(restaurant=self.restaurant)
+            .values("rating")
+            .annotate(count=Count("pk"))
+            .order_by("rating"),
+            "review_restaurant_rating_idx",
+        )
+
+    def test_restaurant_pages(self):
+        for sort, index, value in (
+            ("name", "restaurant_name_id_idx", "Test Restaurant"),
+            ("rating", "restaurant_rating_id_idx", 3.5),
+            ("reviews", "restaurant_reviews_id_idx", 2),
+        ):
+            ordering = SORTS[sort]
+            self.assertUsesIndex(
+                after(Restaurant.objects.all(), ordering, value, 10).order_by(*ordering)[
+                    : PAGE_SIZE + 1
+                ],
+                index,
+            )
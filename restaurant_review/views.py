@@ -1,24 +1,68 @@
-from django.db.models import Avg, Count
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.http import HttpResponseBadRequest, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
+from restaurant_review.caching import (
+    INDEX,
+    bump_version_on_commit,
+    cache_page_versioned,
+    restaurant_scope,
+)
 from restaurant_review.models import Restaurant, Review
+from restaurant_review.pagination import DEFAULT_SORT, REVIEW_ORDERING, SORTS, keyset_page
 
 # Create your views here.
 
+@cache_page_versioned(INDEX, params=('sort', 'after'))
 def index(request):
     print('Request for index page received')
-    restaurants = Restaurant.objects.annotate(avg_rating=Avg('review__rating')).annotate(review_count=Count('review'))
-    return render(request, 'restaurant_review/index.html', {'restaurants': restaurants})
+    sort = request.GET.get('sort', DEFAULT_SORT)
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+    try:
+        restaurants, next_cursor = keyset_page(
+            Restaurant.objects.all(), SORTS[sort], request.GET.get('after')
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Invalid page cursor')
+    return render(request, 'restaurant_review/index.html', {
+        'restaurants': restaurants,
+        'sort': sort,
+        'next_cursor': next_cursor,
+        'first_page': 'after' not in request.GET,
+    })
 
 
+@cache_page_versioned(restaurant_scope)
 def details(request, id):
     print('Request for restaurant details page received')
     restaurant = get_object_or_404(Restaurant, pk=id)
-    return render(request, 'restaurant_review/details.html', {'restaurant': restaurant})
+    # Reviews fetched through the restaurant already hold it as review.restaurant
+    reviews, next_cursor = keyset_page(restaurant.review_set.all(), REVIEW_ORDERING)
+    return render(request, 'restaurant_review/details.html', {
+        'restaurant': restaurant,
+        'reviews': reviews,
+        'next_cursor': next_cursor,
+    })
+
+
+@cache_page_versioned(restaurant_scope, params=('after',))
+def reviews(request, id):
+    print('Request for restaurant reviews page received')
+    try:
+        reviews, next_cursor = keyset_page(
+            Review.objects.filter(restaurant_id=id), REVIEW_ORDERING, request.GET.get('after')
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Invalid page cursor')
+    return render(request, 'restaurant_review/review_rows.html', {
+        'restaurant_id': id,
+        'reviews': reviews,
+        'next_cursor': next_cursor,
+    })
 
 
 def create_restaurant(request):
@@ -43,6 +87,7 @@ def add_restaurant(request):
         restaurant.street_address = street_address
         restaurant.description = description
         Restaurant.save(restaurant)
+        bump_version_on_commit(INDEX)
 
         return HttpResponseRedirect(reverse('details', args=(restaurant.id,)))
 
@@ -64,8 +109,11 @@ def add_review(request, id):
         review.restaurant = restaurant
         review.review_date = timezone.now()
         review.user_name = user_name
-        review.rating = rating
+        review.rating = int(rating)
         review.review_text = review_text
-        Review.save(review)
+        with transaction.atomic():
+            Review.save(review)
+            restaurant.add_rating(review.rating)
+            bump_version_on_commit(INDEX, restaurant_scope(restaurant.id))
 
     return HttpResponseRedirect(reverse('details', args=(id,)))
@@ -1,4 +1,6 @@
 python manage.py migrate
+python manage.py createcachetable
+python manage.py quicklook_worker &
 gunicorn --workers 2 --threads 4 --timeout 60 --access-logfile \
     '-' --error-logfile '-' --bind=0.0.0.0:8000 \
      --chdir=/home/site/wwwroot azureproject.wsgi
\ No newline at end of file